@@ -0,0 +1,254 @@
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from simulation import BIG_PARTICLE_MASS, CONTAINER_DIAMETER, OBSTACLE_RADIUS, PARTICLE_MASS, TextWriter
+
+# Throughput benchmarks of the analysis pipeline on synthetic outputs. Every
+# benchmark runs in a fresh process, so its peak RSS is its own, and reports
+# the best wall time of its repeats. Setup (e.g. loading the data compute_msd
+# works on) is not timed but does count towards the peak RSS. The visualizer
+# benchmarks follow the viewer: a cold FrameSource open, its first frame, and
+# for visualizer_frames VIEWER_FRAMES draw_frame calls on an offscreen
+# surface while the rest is still decoding. The cli_*
+# benchmarks time whole `python cli.py` invocations, imports included (cold
+# start); their memory is reported under children_peak_rss_mb.
+BENCHMARKS = ['parse_cold', 'parse_cached', 'parse_multiple', 'compute_msd', 'compute_dcm',
+              'visualizer_first_frame', 'visualizer_frames', 'cli_startup', 'cli_pressure', 'cli_dcm']
+VIEWER_FRAMES = 300
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+
+
+def write_synthetic_output(filename, n=200, frames=5000, obstacle_present=False, speed=1.0, radius=0.0005, seed=0):
+    """
+    A file in MolecularSimulation's exact output format with made-up but
+    plausible dynamics: particles fly freely and every event turns one or two of
+    them, bouncing them off the wall when they would leave the container.
+    Without the obstacle, particle 0 is the big particle as in the real runs.
+    """
+    rng = np.random.default_rng(seed)
+    container_radius = CONTAINER_DIAMETER / 2
+    particles = np.empty((n, 6))
+    r = np.sqrt(rng.uniform((OBSTACLE_RADIUS + radius) ** 2, (container_radius - radius) ** 2, n))
+    angle = rng.uniform(0, 2 * np.pi, (2, n))
+    particles[:, 0], particles[:, 1] = r * np.cos(angle[0]), r * np.sin(angle[0])
+    particles[:, 2], particles[:, 3] = speed * np.cos(angle[1]), speed * np.sin(angle[1])
+    particles[:, 4], particles[:, 5] = radius, PARTICLE_MASS
+    if not obstacle_present:
+        particles[0] = [0.0, 0.0, 0.0, 0.0, OBSTACLE_RADIUS, BIG_PARTICLE_MASS]
+    limit = container_radius - particles[:, 4]
+
+    writer = TextWriter(filename)
+    t = wall_impulse = obstacle_impulse = 0.0
+    first_time, total = set(), 0
+    mean_dt = 1e-4 * 200 / n
+    try:
+        for _ in range(frames):
+            dt = rng.exponential(mean_dt)
+            t += dt
+            particles[:, 0:2] += particles[:, 2:4] * dt
+            outside = np.hypot(particles[:, 0], particles[:, 1]) > limit
+            particles[outside, 0:2] *= (limit[outside] / np.hypot(particles[outside, 0], particles[outside, 1]))[:, None]
+            particles[outside, 2:4] *= -1
+            turned = rng.choice(n, size=rng.integers(1, 3), replace=False)
+            angle = rng.uniform(0, 2 * np.pi, len(turned))
+            v = np.hypot(particles[turned, 2], particles[turned, 3])
+            particles[turned, 2], particles[turned, 3] = v * np.cos(angle), v * np.sin(angle)
+
+            wall_impulse += 2 * PARTICLE_MASS * speed * rng.random()
+            if obstacle_present and len(turned) == 1:
+                obstacle_impulse += 2 * PARTICLE_MASS * speed * rng.random()
+                first_time.add(int(turned[0]))
+                total += 1
+            writer.write(t, wall_impulse / (np.pi * CONTAINER_DIAMETER * t),
+                         obstacle_impulse / (2 * np.pi * OBSTACLE_RADIUS * t), len(first_time), total, particles)
+    finally:
+        writer.close()
+    return filename
+
+
+def _remove_sidecars(filename):
+    shutil.rmtree(filename + '.cache', ignore_errors=True)
+    if os.path.exists(filename + '.index.npz'):
+        os.remove(filename + '.index.npz')
+
+
+def _prepare(name, files):
+    """Untimed setup; returns the timed callable"""
+    if name in ('parse_cold', 'parse_cached'):
+        from observables import parse_simulation_file
+        if name == 'parse_cached':
+            parse_simulation_file(files[0])
+            return lambda: parse_simulation_file(files[0])
+
+        def run():
+            _remove_sidecars(files[0])
+            parse_simulation_file(files[0])
+        return run
+    if name == 'parse_multiple':
+        from observables import parse_multiple_simulation_files
+
+        def run():
+            for f in files:
+                _remove_sidecars(f)
+            parse_multiple_simulation_files(files)
+        return run
+    if name in ('compute_msd', 'compute_dcm'):
+        from cache import load_simulation_files
+        from dcm import big_particle_states, compute_dcm, compute_msd
+        states = [big_particle_states(data) for data in load_simulation_files(files, workers=1)]
+        if name == 'compute_msd':
+            times, positions = states[0]
+            return lambda: compute_msd(np.asarray(times), np.asarray(positions), start_time=times[0],
+                                       interval=(times[-1] - times[0]) / 100)
+        return lambda: compute_dcm([t for t, _ in states], [p for _, p in states])
+    if name in ('visualizer_first_frame', 'visualizer_frames'):
+        os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+        import pygame
+        import visualization
+        from frames import FrameSource
+        surface = pygame.Surface((visualization.WIDTH, visualization.HEIGHT))
+        draws = 1 if name == 'visualizer_first_frame' else VIEWER_FRAMES
+
+        def run():
+            _remove_sidecars(files[0])
+            source = FrameSource(files[0], write_sidecar=False)
+            source.wait(1)
+            radius = source.radius()
+            radii = visualization.screen_radii(radius)
+            visualization.obstacle_present = not np.any(radius == OBSTACLE_RADIUS)
+            for i in range(draws):
+                # Playback holds at the last decoded frame, as in visualization.main
+                _, particles = source.frame(min(i, len(source) - 1))
+                visualization.draw_frame(surface, particles[:, 0:2], radii)
+            # Let the decoder finish untimed, so it does not slow the next repeat
+            return lambda: source.wait(float('inf'))
+        return run
+    if name.startswith('cli_'):
+        command = {'cli_startup': ['--help'], 'cli_pressure': ['pressure', files[0]],
+                   'cli_dcm': ['dcm', *files]}.get(name)
+        if command is not None:
+            # Sidecars built beforehand, so only the start-up and the analysis are timed
+            from cache import load_simulation_files
+            load_simulation_files(files, workers=1)
+            return lambda: subprocess.run([sys.executable, CLI, *command], check=True, capture_output=True)
+    raise ValueError(f"Unknown benchmark {name!r}, expected one of {BENCHMARKS}.")
+
+
+def _run(name, files, repeat):
+    run = _prepare(name, files)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        finish = run()
+        timings.append(time.perf_counter() - start)
+        # A benchmark may hand back untimed cleanup, e.g. background work to wait for
+        if callable(finish):
+            finish()
+    # ru_maxrss is in KiB on Linux
+    return {
+        'wall_time': min(timings),
+        'timings': timings,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'children_peak_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def _frames_processed(name, frames, files):
+    if name == 'cli_startup':
+        return 0
+    if name == 'visualizer_first_frame':
+        return 1
+    if name == 'visualizer_frames':
+        return VIEWER_FRAMES
+    return frames * len(files) if name in ('parse_multiple', 'compute_dcm', 'cli_dcm') else frames
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(n=200, frames=5000, files=4, obstacle_present=False, repeat=3, names=None, directory=None):
+    """Generate the synthetic outputs, run every benchmark and return the JSON-ready report"""
+    names = names or BENCHMARKS
+    owned = directory is None
+    directory = directory or tempfile.mkdtemp(prefix='benchmark-')
+    results = []
+    try:
+        start = time.perf_counter()
+        paths = [write_synthetic_output(os.path.join(directory, f"output-{n}-{i + 1}.txt"), n, frames,
+                                        obstacle_present, seed=i)
+                 for i in range(files)]
+        generation_time = time.perf_counter() - start
+
+        context = multiprocessing.get_context('spawn')
+        for name in names:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(_run, name, paths, repeat).result()
+            processed = _frames_processed(name, frames, paths)
+            results.append({'name': name, 'frames': processed,
+                            'frames_per_second': processed / result['wall_time'], **result})
+    finally:
+        if owned:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'params': {'n': n, 'frames': frames, 'files': files, 'obstacle_present': obstacle_present,
+                   'repeat': repeat, 'generation_time': generation_time},
+        'results': results,
+    }
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(flag, default, cast):
+        if flag not in args:
+            return default
+        i = args.index(flag)
+        value = cast(args[i + 1])
+        del args[i:i + 2]
+        return value
+
+    n = option('--n', 200, int)
+    frames = option('--frames', 5000, int)
+    files = option('--files', 4, int)
+    repeat = option('--repeat', 3, int)
+    output = option('--output', None, str)
+    names = option('--only', None, lambda value: value.split(','))
+    obstacle_present = '--obstacle' in args
+
+    report = run_benchmarks(n, frames, files, obstacle_present, repeat, names)
+    text = json.dumps(report, indent=2)
+    if output is None:
+        print(text)
+    else:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+        for result in report['results']:
+            # The cli_* benchmarks run in a subprocess, whose memory is the one of interest
+            rss = result['children_peak_rss_mb'] if result['name'].startswith('cli_') else result['peak_rss_mb']
+            print(f"{result['name']:>22}: {result['wall_time']:.3f} s  {result['frames_per_second']:.0f} frames/s  "
+                  f"{rss:.0f} MB")
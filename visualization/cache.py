@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from reader import DELTA_SUFFIX, SimulationData, read_simulation_file
+
+# Sidecar layout, next to each output-N-V.txt:
+#   output-N-V.txt.cache/meta.json      source size/mtime and shape
+#   output-N-V.txt.cache/header.npy     HEADER_COLUMNS x frames, one contiguous row per column
+#   output-N-V.txt.cache/particles.npy  frames x N x 6
+CACHE_SUFFIX = '.cache'
+CACHE_VERSION = 1
+
+
+def cache_path(filename):
+    return filename + CACHE_SUFFIX
+
+
+def _source_stamp(filename):
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def has_valid_cache(filename):
+    return _is_valid(filename, cache_path(filename))
+
+
+def _is_valid(filename, directory):
+    try:
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return meta.get('version') == CACHE_VERSION and meta.get('source') == _source_stamp(filename)
+
+
+def _read_cache(directory):
+    header = np.load(os.path.join(directory, 'header.npy'), mmap_mode='r')
+    particles = np.load(os.path.join(directory, 'particles.npy'), mmap_mode='r')
+    return SimulationData(
+        times=header[0],
+        wall_pressure=header[1],
+        obstacle_pressure=header[2],
+        first_time_collisions=header[3].astype(np.int64),
+        total_collisions=header[4].astype(np.int64),
+        particles=particles,
+    )
+
+
+def write_cache(filename, data):
+    """Write the sidecar for filename atomically, replacing any stale one"""
+    directory = cache_path(filename)
+    # Stamp the source before writing so a concurrent append invalidates the cache
+    stamp = _source_stamp(filename)
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        header = np.stack([
+            data.times, data.wall_pressure, data.obstacle_pressure,
+            data.first_time_collisions, data.total_collisions,
+        ]).astype(np.float64)
+        np.save(os.path.join(tmp, 'header.npy'), header)
+        np.save(os.path.join(tmp, 'particles.npy'), np.ascontiguousarray(data.particles))
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({
+                'version': CACHE_VERSION,
+                'source': stamp,
+                'n': data.n,
+                'frames': data.frames,
+            }, f)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(tmp, directory)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def load_simulation_file(filename, use_cache=True):
+    """
+    Load a simulation output file, going through its binary sidecar when possible.
+    The sidecar is memory-mapped on later loads and rebuilt whenever the source
+    file's size or mtime changes.
+    """
+    if not use_cache or filename.endswith(DELTA_SUFFIX):
+        # Delta files are already compact and binary
+        return read_simulation_file(filename)
+
+    directory = cache_path(filename)
+    if _is_valid(filename, directory):
+        return _read_cache(directory)
+
+    data = read_simulation_file(filename)
+    try:
+        write_cache(filename, data)
+    except OSError:
+        # Read-only location: fall back to the parsed arrays
+        return data
+    return _read_cache(directory)
+
+
+def _build_cache(filename):
+    data = load_simulation_file(filename)
+    # Only ship the arrays back when they could not be left on disk
+    return None if isinstance(data.particles, np.memmap) else data
+
+
+def load_simulation_files(files, workers=None):
+    """
+    Parse several output files concurrently. Workers leave their results in the
+    sidecar caches, which are then memory-mapped here in the order of files, so
+    nothing but the file names crosses process boundaries.
+    """
+    files = list(files)
+    if workers == 1 or len(files) <= 1:
+        return [load_simulation_file(f) for f in files]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_build_cache, files))
+    return [data if data is not None else load_simulation_file(f) for f, data in zip(files, results)]
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+import argparse
+import sys
+
+# Single entry point for the analysis scripts:
+#   python cli.py <command> [options] <files...>
+# Only argparse is imported up front. Each command imports the modules it needs
+# when it runs, so short invocations never pay for pandas, matplotlib, scipy or
+# pygame unless they use them: printing pressures needs NumPy alone, D NumPy,
+# pandas and scipy, and plotting is opt-in (--plot, figures saved headless to
+# observables/). benchmark.py measures the cold start.
+
+
+def _cache(args):
+    if args.delta:
+        from delta import convert
+        for filename in args.files:
+            print(f"{filename}: {convert(filename)}")
+    elif args.index:
+        from frame_index import load_index
+        for filename in args.files:
+            print(f"{filename}: {len(load_index(filename)['times'])} frames")
+    else:
+        from cache import load_simulation_files
+        for filename, data in zip(args.files, load_simulation_files(args.files, args.workers)):
+            print(f"{filename}: {data.frames} frames, {data.n} partículas")
+
+
+def _pressure(args):
+    if args.sweep:
+        from summary import SummaryStore
+        with SummaryStore() as store:
+            summaries = store.summaries(args.files, args.workers, args.equilibration, args.blocks)
+        print(summaries[['temperature', 'wall_mean', 'obstacle_mean', 'collision_rate']])
+        if args.plot:
+            _headless()
+            from observables import plot_sweep_from_summaries
+            plot_sweep_from_summaries(summaries)
+        return
+
+    from pressure import pressure_estimate
+    from query import query_files
+    projections = query_files(args.files, args.workers, scalars=('wall_pressure', 'obstacle_pressure'))
+    for filename, projection in zip(args.files, projections):
+        wall = pressure_estimate(projection.times, projection.wall_pressure, args.equilibration, args.blocks)
+        obstacle = pressure_estimate(projection.times, projection.obstacle_pressure, args.equilibration, args.blocks)
+        print(f"{filename}: pared {wall['mean']:.3e} ± {wall['error']:.1e} N/m, "
+              f"obstáculo {obstacle['mean']:.3e} ± {obstacle['error']:.1e} N/m")
+    if args.plot:
+        _headless()
+        from observables import parse_simulation_headers, plot_pressures_over_time
+        df_pressure, _ = parse_simulation_headers(args.files, args.workers)
+        for path in plot_pressures_over_time(df_pressure, True, batch=True, workers=args.workers):
+            print(f"Figura escrita en {path}")
+
+
+def _dcm(args):
+    from dcm import run_dcm
+    figure = None
+    if args.plot:
+        _headless()
+        figure = 'observables/dcm_linear_fit.png'
+    run_dcm(args.files, args.workers, args.fft, args.bootstrap, plot=args.plot, figure=figure)
+    if figure is not None:
+        print(f"Figura escrita en {figure}")
+
+
+def _collisions(args):
+    from collisions import report_collisions
+    if args.plot:
+        _headless()
+    for filename in args.files:
+        report_collisions(filename, args.bins, plot=args.plot)
+
+
+def _visualize(args):
+    from visualization import main
+    main(args.file, args.dt, args.speed, follow=args.follow, dots=args.dots)
+
+
+def _export(args):
+    from visualization import export_frames
+    count = export_frames(args.file, args.output, args.dt, args.workers, args.format)
+    print(f"{count} frames written to {args.output}")
+
+
+def _observables_directory():
+    import os
+    os.makedirs('observables', exist_ok=True)
+
+
+def _headless():
+    # Figures are only saved to observables/, never shown
+    import matplotlib
+    matplotlib.use('Agg')
+    _observables_directory()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description="Análisis de las salidas de MolecularSimulation.")
+    parser.add_argument('--profile', action='store_true',
+                        help="reporte por etapa en profile-<comando>.json/.csv")
+    parser.add_argument('--profile-memory', action='store_true', help="como --profile, con picos de memoria")
+    commands = parser.add_subparsers(dest='command', required=True, metavar='<comando>')
+
+    def command(name, function, help, aliases=(), files=True, workers=True):
+        sub = commands.add_parser(name, help=help, description=help, aliases=list(aliases))
+        if files:
+            sub.add_argument('files', nargs='+', metavar='simulation_file')
+        if workers:
+            sub.add_argument('--workers', type=int, help="procesos en paralelo")
+        sub.set_defaults(run=function, profile_name=name)
+        return sub
+
+    sub = command('cache', _cache, "Parsear las salidas y dejar sus caches binarios al lado", aliases=['parse'])
+    sub.add_argument('--index', action='store_true', help="sólo el índice de frames (.index.npz)")
+    sub.add_argument('--delta', action='store_true', help="convertir al formato delta (.delta.npz)")
+
+    sub = command('pressure', _pressure, "Presión de equilibrio en la pared y el obstáculo")
+    sub.add_argument('--sweep', action='store_true', help="resúmenes por temperatura desde summaries.sqlite")
+    sub.add_argument('--plot', action='store_true', help="escribir las figuras en observables/")
+    sub.add_argument('--equilibration', type=float, default=0.1, help="fracción inicial descartada")
+    sub.add_argument('--blocks', type=int, default=256, help="bloques del error de la media")
+
+    sub = command('dcm', _dcm, "Coeficiente de difusión de la partícula grande")
+    sub.add_argument('--fft', type=float, metavar='DT', help="promediar sobre todos los orígenes, remuestreando cada DT s")
+    sub.add_argument('--bootstrap', type=int, metavar='SAMPLES', help="intervalos de confianza por bootstrap")
+    sub.add_argument('--plot', action='store_true', help="escribir el ajuste lineal en observables/")
+
+    sub = command('collisions', _collisions, "Colisiones por tipo y camino libre medio", workers=False)
+    sub.add_argument('--bins', type=int, default=100)
+    sub.add_argument('--plot', action='store_true', help="escribir las figuras en observables/")
+
+    sub = command('visualize', _visualize, "Reproducir una salida en una ventana", files=False, workers=False)
+    sub.add_argument('file', metavar='simulation_file')
+    playback = sub.add_mutually_exclusive_group()
+    playback.add_argument('--dt', type=float, help="paso constante de tiempo simulado")
+    playback.add_argument('--speed', type=float, help="segundos simulados por segundo real, saltando frames")
+    sub.add_argument('--dots', action='store_true', help="partículas como puntos")
+    sub.add_argument('--follow', action='store_true', help="seguir un archivo que aún se está escribiendo")
+
+    sub = command('export', _export, "Renderizar una salida a imágenes sin pantalla", files=False)
+    sub.add_argument('file', metavar='simulation_file')
+    sub.add_argument('output', metavar='directory')
+    sub.add_argument('--dt', type=float, help="un frame cada DT segundos simulados")
+    sub.add_argument('--format', choices=['png', 'raw'], default='png')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile or args.profile_memory:
+        from profiling import enable_from_args
+        enable_from_args(['--profile-memory' if args.profile_memory else '--profile'], args.profile_name)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
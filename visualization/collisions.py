@@ -0,0 +1,190 @@
+import os
+import sys
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from delta import DeltaTrajectory, encode, is_delta_file
+from reader import iter_frame_chunks
+from simulation import NONE, OBSTACLE, PARTICLE_PARTICLE, WALL
+
+# Which particles took part in each event, recovered from the frames alone: the
+# velocities that change between consecutive frames are the colliding
+# particles, and a single one is an obstacle collision when the obstacle
+# counter grows and a wall collision otherwise (see delta.encode, which does
+# this diff for the delta format). Everything below works on the flat arrays of
+# changes, without per-particle loops.
+EVENT_TYPES = {WALL: 'wall', OBSTACLE: 'obstacle', PARTICLE_PARTICLE: 'pair'}
+EVENT_LABELS = {WALL: 'Pared', OBSTACLE: 'Obstáculo', PARTICLE_PARTICLE: 'Partícula-partícula'}
+# matplotlib is imported by the plots only, so the printed summary does not pay for it
+
+
+class CollisionEvents(NamedTuple):
+    times: np.ndarray         # frames, time of each event
+    types: np.ndarray         # frames, WALL, OBSTACLE, PARTICLE_PARTICLE (NONE for frame 0)
+    change_frame: np.ndarray  # M, frame of each particle change, ascending
+    change_id: np.ndarray     # M, particle of each change
+    change_state: np.ndarray  # M x 4, x, y, vx, vy after the change
+    n: int
+
+    @property
+    def change_types(self):
+        return self.types[self.change_frame]
+
+
+def reconstruct_events(filename, chunk_frames=1024):
+    """Colliding particles and type of every event of an output, streamed chunk by chunk"""
+    if is_delta_file(filename):
+        # Already stored as changes
+        trajectory = DeltaTrajectory(filename)
+        arrays = {'event_times': trajectory.event_times, 'event_type': trajectory.event_type,
+                  'change_frame': trajectory.change_frame, 'change_id': trajectory.change_id,
+                  'change_state': trajectory.change_state, 'radius': trajectory.radius}
+    else:
+        arrays = encode(iter_frame_chunks(filename, chunk_frames))
+    return _collision_events(arrays)
+
+
+def events_from_data(data):
+    """reconstruct_events for a run already in memory (a SimulationData)"""
+    return _collision_events(encode([data]))
+
+
+def _collision_events(arrays):
+    return CollisionEvents(
+        times=arrays['event_times'],
+        types=arrays['event_type'],
+        change_frame=arrays['change_frame'],
+        change_id=arrays['change_id'],
+        change_state=arrays['change_state'],
+        n=len(arrays['radius']),
+    )
+
+
+def collision_counts(events):
+    """Per-particle number of collisions of each type, plus the total"""
+    types = events.change_types
+    counts = {name: np.bincount(events.change_id[types == kind], minlength=events.n)
+              for kind, name in EVENT_TYPES.items()}
+    counts['total'] = np.bincount(events.change_id[types != NONE], minlength=events.n)
+    return pd.DataFrame(counts, index=pd.Index(np.arange(events.n), name='particle'))
+
+
+def free_flights(events):
+    """
+    Every free flight between two collisions of the same particle: particle,
+    duration, length (speed after the first collision times duration) and the
+    type of the collision that ends it. The flight before a particle's first
+    collision is censored and left out.
+    """
+    order = np.lexsort((events.change_frame, events.change_id))
+    particle = events.change_id[order]
+    frame = events.change_frame[order]
+    state = events.change_state[order]
+
+    start = np.arange(len(order) - 1)
+    start = start[(particle[start] == particle[start + 1]) & (events.types[frame[start]] != NONE)]
+    end = start + 1
+
+    duration = events.times[frame[end]] - events.times[frame[start]]
+    speed = np.hypot(state[start, 2], state[start, 3])
+    return pd.DataFrame({
+        'particle': particle[start],
+        'duration': duration,
+        'length': speed * duration,
+        'ending': events.types[frame[end]],
+    })
+
+
+def mean_free_path(flights):
+    return {
+        'mean_free_time': flights['duration'].mean(),
+        'mean_free_path': flights['length'].mean(),
+        'flights': len(flights),
+    }
+
+
+def collision_rates(events, bins=100):
+    """Events per second of each type in bins equal time windows"""
+    edges = np.linspace(events.times[0], events.times[-1], bins + 1)
+    width = np.diff(edges)
+    rates = {'time': 0.5 * (edges[:-1] + edges[1:])}
+    for kind, name in EVENT_TYPES.items():
+        rates[name] = np.histogram(events.times[events.types == kind], bins=edges)[0] / width
+    return pd.DataFrame(rates)
+
+
+def plot_collision_rates(rates, name):
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(10, 6))
+    for kind, column in EVENT_TYPES.items():
+        plt.plot(rates['time'], rates[column], label=EVENT_LABELS[kind])
+    plt.xlabel('Tiempo [s]', fontsize=14)
+    plt.ylabel('Tasa de colisiones [collision/s]', fontsize=14)
+    plt.legend()
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(f'observables/collision_rates_{os.path.basename(name)}.png')
+    plt.show()
+
+
+def plot_free_flights(flights, name, bins=100):
+    import matplotlib.pyplot as plt
+    fig, (ax_time, ax_length) = plt.subplots(1, 2, figsize=(14, 6))
+    ax_time.hist(flights['duration'], bins=bins, density=True, color='orange')
+    ax_time.set_xlabel('Tiempo de vuelo libre [s]', fontsize=14)
+    ax_time.set_ylabel('Densidad de probabilidad', fontsize=14)
+    ax_time.grid(True)
+    ax_length.hist(flights['length'], bins=bins, density=True, color='green')
+    ax_length.axvline(flights['length'].mean(), color='gray', linestyle=':', label='Camino libre medio')
+    ax_length.set_xlabel('Camino libre [m]', fontsize=14)
+    ax_length.legend()
+    ax_length.grid(True)
+    fig.tight_layout()
+    fig.savefig(f'observables/free_flights_{os.path.basename(name)}.png')
+    plt.show()
+
+
+def plot_collision_counts(counts, name):
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(10, 6))
+    plt.hist(counts['total'], bins=range(counts['total'].max() + 2), color='blue')
+    plt.xlabel('Colisiones por partícula', fontsize=14)
+    plt.ylabel('Número de partículas', fontsize=14)
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(f'observables/collision_counts_{os.path.basename(name)}.png')
+    plt.show()
+
+
+def report_collisions(filename, bins=100, plot=True):
+    """Print the event counts and mean free path of a run; with plot, save and show its figures"""
+    events = reconstruct_events(filename)
+    flights = free_flights(events)
+    stats = mean_free_path(flights)
+    print(f"{filename}: " + ", ".join(f"{EVENT_TYPES[kind]} {np.sum(events.types == kind)}" for kind in EVENT_TYPES))
+    print(f"  Camino libre medio: {stats['mean_free_path']:.3e} m, "
+          f"tiempo libre medio: {stats['mean_free_time']:.3e} s ({stats['flights']} vuelos)")
+    if plot:
+        plot_collision_counts(collision_counts(events), filename)
+        plot_free_flights(flights, filename, bins)
+        plot_collision_rates(collision_rates(events, bins), filename)
+    return stats
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python collisions.py [--bins N] <simulation_file1> <simulation_file2> ...")
+        sys.exit(1)
+
+    filenames = sys.argv[1:]
+    bins = 100
+    if '--bins' in filenames:
+        i = filenames.index('--bins')
+        bins = int(filenames[i + 1])
+        del filenames[i:i + 2]
+
+    os.makedirs('observables', exist_ok=True)
+    for filename in filenames:
+        report_collisions(filename, bins)
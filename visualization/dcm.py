@@ -1,63 +1,57 @@
 import sys
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from scipy.stats import linregress
+from reader import VY, X, Y
+from query import query, query_files
+from profiling import enable_from_args, stage
+from ensemble import bootstrap_dcm, ensemble_squared_displacements
+from msd import ensemble_msd
+from resample import resample_positions
 
 
-def parse_big_particle_positions(filename):
-    times = []
-    positions = []
-
-    with open(filename, "r") as f:
-        lines = [line.strip() for line in f if line.strip()]
-
-    idx = 0
-    N = int(lines[idx])
-    idx += 1
-
-    while idx < len(lines):
-        t = float(lines[idx])
-        idx += 6  # Skip time, wall_pressure, obstacle_pressure
+def big_particle_positions(data):
+    # The big particle is always written first
+    return data.times, data.particles[:, 0, [X, Y]]
 
-        parts = lines[idx].split()
-        x, y = float(parts[0]), float(parts[1])
-        positions.append((x, y))
-        times.append(t)
-        idx += N
+def big_particle_states(data):
+    # x, y, vx, vy of the big particle, e.g. for ParticleTable-style resampling
+    return data.times, data.particles[:, 0, X:VY + 1]
 
-
-    return np.array(times), np.array(positions)
+def parse_big_particle_positions(filename):
+    # Only x, y of particle 0 are decoded
+    projection = query(filename, fields=('x', 'y'), particles=0)
+    return projection.times, projection.particles[:, 0]
 
 def compute_msd(times, positions, start_time=0.5, interval=0.2, max_time=None):
+    """
+    positions is frames x 2 (x, y), taking the first frame after t0 and t0 + interval,
+    or frames x 4 (x, y, vx, vy), interpolating linearly at those times instead.
+    """
     if max_time is None:
         max_time = times[-1]
+    times = np.asarray(times)
+    positions = np.asarray(positions)
 
-    dcm_times = []
-    dcm_values = []
-    dcm_stds=[]
-    t0 = start_time
-    while t0 + interval <= max_time:
+    count = int(np.floor((max_time - interval - start_time) / interval + 1e-9)) + 1
+    t0 = start_time + interval * np.arange(max(count, 0))
+
+    if positions.shape[1] == 4:
+        r0 = resample_positions(times, positions, t0)
+        r1 = resample_positions(times, positions, t0 + interval)
+    else:
         i = np.searchsorted(times, t0, side='left')
         j = np.searchsorted(times, t0 + interval, side='left')
+        valid = (i < len(times)) & (j < len(times))
+        t0, r0, r1 = t0[valid], positions[i[valid]], positions[j[valid]]
 
-        if i < len(times) and j < len(times):
-            r0 = positions[i]
-            r1 = positions[j]
-            displacement = r1 - r0
-            squared_displacement = np.average(displacement ** 2)
-
-            dcm_times.append(t0)
-            dcm_values.append(squared_displacement)
-            dcm_stds.append(np.std(displacement**2))
-        t0 += interval
-
-    return np.array(dcm_times), np.array(dcm_values),np.array(dcm_stds)
+    squared_displacement = (r1 - r0) ** 2
+    return t0, np.average(squared_displacement, axis=1), np.std(squared_displacement, axis=1)
 
 """
 In the compute_dcm function, the goal is to align the time points from multiple simulation runs to a common set of 
-evenly spaced time points (common_times). This is necessary because the time points in each simulation run (sorted_times)
-may not match exactly. Interpolation is used to estimate the x-coordinates (sorted_x) at these common time points.
+evenly spaced time points (common_times). This is necessary because the time points in each simulation run
+may not match exactly. Linear interpolation is used to estimate the
+positions at these common time points, for every run in one batched pass.
 """
 def compute_dcm(times, all_positions, start_time=0.05, num_points=50):
     """
@@ -80,43 +74,16 @@ def compute_dcm(times, all_positions, start_time=0.05, num_points=50):
 
     effective_start_time = start_time if start_time >= min_overall_time else min_overall_time
     common_times = np.linspace(effective_start_time, max_overall_time, num_points)
-    all_squared_displacements = np.zeros((num_runs, num_points))
 
     for i in range(num_runs):
-        time_points = times[i]
-        positions = all_positions[i]
-
-        if not len(time_points) == len(positions):
+        if not len(times[i]) == len(all_positions[i]):
             raise ValueError(f"Time and position arrays for run {i+1} must have the same length.")
+        positions_array = np.asarray(all_positions[i])
+        if positions_array.ndim != 2 or positions_array.shape[1] not in (2, 4):
+            raise ValueError(f"Position array for run {i+1} must be 2-dimensional with (x, y) or (x, y, vx, vy) columns.")
 
-        positions_array = np.array(positions)
-        if positions_array.ndim != 2 or positions_array.shape[1] != 2:
-            raise ValueError(f"Position array for run {i+1} must be 2-dimensional with (x, y) coordinates.")
-
-        x_coords = positions_array[:, 0]
-        y_coords = positions_array[:, 1]
-
-        # Ensure time points are sorted for interpolation
-        sort_indices = np.argsort(time_points)
-        sorted_times = time_points[sort_indices]
-        sorted_x = x_coords[sort_indices]
-        sorted_y = y_coords[sort_indices]
-
-        # Find initial position (at the first recorded time)
-        initial_x = sorted_x[0] if len(sorted_x) > 0 else 0.0
-        initial_y = sorted_y[0] if len(sorted_y) > 0 else 0.0
-
-        squared_displacements = np.zeros(num_points)
-        if len(sorted_times) > 1:
-            interp_x = np.interp(common_times, sorted_times, sorted_x)
-            interp_y = np.interp(common_times, sorted_times, sorted_y)
-            squared_displacements = (interp_x - initial_x)**2 + (interp_y - initial_y)**2
-        elif len(sorted_times) == 1:
-            squared_displacements = np.full(num_points, (sorted_x - initial_x)**2 + (sorted_y - initial_y)**2)
-        else:
-            squared_displacements = np.zeros(num_points)  # If no data points in the run
-
-        all_squared_displacements[i] = squared_displacements
+    # All runs at once, linearly interpolated and clamped to each run's time range
+    all_squared_displacements = ensemble_squared_displacements(times, all_positions, common_times)
 
     average_msd_values = np.mean(all_squared_displacements, axis=0)
     std_deviation_values = np.std(all_squared_displacements, axis=0)
@@ -128,9 +95,13 @@ def compute_dcm(times, all_positions, start_time=0.05, num_points=50):
     })
 
 
-import matplotlib.pyplot as plt
+# matplotlib and scipy are imported by the functions that use them, so loading
+# this module and computing the MSD do not pay for them
 
-def plot_linear_dcm_interval(average_msd_df, t_min=0.05, t_max=0.2):
+def plot_linear_dcm_interval(average_msd_df, t_min=0.05, t_max=0.2, path=None):
+    """With path, the figure is also saved there"""
+    import matplotlib.pyplot as plt
+    from scipy.stats import linregress
     mask = (average_msd_df['time'] >= t_min) & (average_msd_df['time'] <= t_max)
     linear_df = average_msd_df[mask]
 
@@ -165,10 +136,13 @@ def plot_linear_dcm_interval(average_msd_df, t_min=0.05, t_max=0.2):
     plt.grid(True)
     plt.legend()
     plt.tight_layout()
+    if path is not None:
+        plt.savefig(path)
     plt.show()
 
 
 def plot_dcm(average_msd_df):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(8, 6))
     plt.errorbar(
         average_msd_df['time'],
@@ -188,6 +162,7 @@ def plot_dcm(average_msd_df):
     plt.show()
 
 def compute_diffusion_coefficient(average_msd_df):
+    from scipy.stats import linregress
     # Filter the data for the initial linear growth phase
     filtered_df = average_msd_df[average_msd_df['time'] <= 0.18]
     times = filtered_df['time'].values
@@ -207,6 +182,7 @@ def compute_diffusion_coefficient(average_msd_df):
 
 
 def estimate_diffusion_coefficient(msd_df, dimension=2, t_min=0.05, t_max=0.2):
+    from scipy.stats import linregress
     mask = (msd_df['time'] >= t_min) & (msd_df['time'] <= t_max)
     times = msd_df['time'][mask]
     msd = msd_df['average_msd'][mask]
@@ -222,25 +198,71 @@ def estimate_diffusion_coefficient(msd_df, dimension=2, t_min=0.05, t_max=0.2):
         'r_squared': r_value ** 2
     }
 
-if __name__=="__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python dcm.py <simulation_file1> <simulation_file2> ...")
-        sys.exit(1)
-
-    filenames = sys.argv[1:]
+def run_dcm(filenames, workers=None, fft_dt=None, bootstrap_samples=None, plot=True, figure=None):
+    """
+    D of the big particle over the runs in filenames, printed; with plot, the
+    fitted interval is shown, and saved to figure when given.
+    """
     all_positions = []
     all_times = []
-    for filename in filenames:
+    # Only the big particle's state is decoded from each file
+    with stage('parse') as parse:
+        projections = query_files(filenames, workers, fields=('x', 'y', 'vx', 'vy'), particles=0)
+        parse.add(frames=sum(projection.frames for projection in projections),
+                  bytes_read=sum(projection.nbytes for projection in projections))
+    for filename, projection in zip(filenames, projections):
         print(f"Processing file: {filename}")
-        times, positions = parse_big_particle_positions(filename)
-        all_times.append(times)
-        all_positions.append(positions)
+        all_times.append(projection.times)
+        all_positions.append(projection.particles[:, 0])
 
-    average_msd_df = compute_dcm(all_times, all_positions)
-    d, slope, std_err = compute_diffusion_coefficient(average_msd_df)
+    with stage('msd', frames=sum(len(t) for t in all_times)):
+        if fft_dt is None:
+            average_msd_df = compute_dcm(all_times, all_positions)
+        else:
+            average_msd_df = ensemble_msd(all_times, all_positions, fft_dt)
+    with stage('fit'):
+        d, slope, std_err = compute_diffusion_coefficient(average_msd_df)
     #plot_dcm(average_msd_df)
-    plot_linear_dcm_interval(average_msd_df)
+    if plot:
+        with stage('render'):
+            plot_linear_dcm_interval(average_msd_df, path=figure)
 
     print(f"Coeficiente de difusión (D): {d:.1e}")
     print(f"Pendiente: {slope:.1e}")
     print(f"Error std: {std_err:.1e}")
+
+    if bootstrap_samples is not None:
+        with stage('bootstrap'):
+            _, bootstrap = bootstrap_dcm(all_times, all_positions, samples=bootstrap_samples, workers=workers)
+        print(f"D (ajuste 0.05-0.2 s): {bootstrap['D']:.1e}, "
+              f"IC {bootstrap['confidence']:.0%}: [{bootstrap['D_ci_low']:.1e}, {bootstrap['D_ci_high']:.1e}]")
+    return d, slope, std_err
+
+if __name__=="__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python dcm.py [--workers N] [--fft <dt>] [--bootstrap <samples>] [--profile | --profile-memory] "
+              "<simulation_file1> <simulation_file2> ...")
+        sys.exit(1)
+
+    filenames = sys.argv[1:]
+    # --profile / --profile-memory: per-stage report in profile-dcm.json/.csv
+    enable_from_args(filenames, 'dcm')
+    workers = None
+    if '--workers' in filenames:
+        i = filenames.index('--workers')
+        workers = int(filenames[i + 1])
+        del filenames[i:i + 2]
+    # --fft <dt>: average over every time origin on trajectories resampled every dt seconds
+    fft_dt = None
+    if '--fft' in filenames:
+        i = filenames.index('--fft')
+        fft_dt = float(filenames[i + 1])
+        del filenames[i:i + 2]
+    # --bootstrap <samples>: confidence intervals for the MSD curve and D, resampling runs
+    bootstrap_samples = None
+    if '--bootstrap' in filenames:
+        i = filenames.index('--bootstrap')
+        bootstrap_samples = int(filenames[i + 1])
+        del filenames[i:i + 2]
+
+    run_dcm(filenames, workers, fft_dt, bootstrap_samples)
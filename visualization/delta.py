@@ -0,0 +1,241 @@
+import sys
+
+import numpy as np
+
+from reader import DELTA_SUFFIX, MASS, RADIUS, SimulationData, VX, VY, X, iter_frame_chunks
+from simulation import NONE, OBSTACLE, PARTICLE_PARTICLE, WALL
+
+# Each event only changes the velocities of one or two particles, so a run is
+# stored as its first frame plus, per event, the particles that changed and
+# their new state; every other particle is in free flight and is recovered by
+# ballistic advance from its last change. Layout of a .delta.npz file:
+#
+#   header         frames x 5   HEADER_COLUMNS as written (time, pressures, counters)
+#   event_times    frames       event times used for the kinematics
+#   event_type     frames       WALL, OBSTACLE, PARTICLE_PARTICLE, NONE or MULTIPLE
+#   change_frame   M            frame of each change, ascending; the first N are frame 0
+#   change_id      M            particle of each change
+#   change_state   M x 4        x, y, vx, vy right after the change
+#   radius, mass   N            per-particle constants
+#
+# Text outputs only keep 4 significant digits of time (%.3e), far coarser than
+# their positions. The converter therefore recovers each event's duration from
+# the displacement of the particles that did not collide (least squares of
+# dx = v dt), which keeps reconstructed positions within the text's precision.
+MULTIPLE = -1
+
+
+def delta_path(filename):
+    return filename[:-len('.txt')] + DELTA_SUFFIX if filename.endswith('.txt') else filename + DELTA_SUFFIX
+
+
+def is_delta_file(filename):
+    return str(filename).endswith(DELTA_SUFFIX)
+
+
+def encode(chunks):
+    """Delta-encode consecutive SimulationData chunks; returns the arrays of the format"""
+    headers, times, types, frames, ids, states = [], [], [], [], [], []
+    previous = None
+    offset = 0
+    radius = mass = None
+
+    for chunk in chunks:
+        particles = np.asarray(chunk.particles)
+        if not len(particles):
+            continue
+        if previous is None:
+            radius, mass = particles[0, :, RADIUS].copy(), particles[0, :, MASS].copy()
+            previous = (particles[0], chunk.times[0], chunk.total_collisions[0])
+        before = np.concatenate([previous[0][None], particles[:-1]])
+        before_times = np.concatenate([[previous[1]], chunk.times[:-1]])
+        before_total = np.concatenate([[previous[2]], chunk.total_collisions[:-1]])
+
+        changed = np.any(particles[:, :, VX:VY + 1] != before[:, :, VX:VY + 1], axis=2)
+        if offset == 0:
+            # Frame 0 anchors every particle
+            changed[0] = True
+
+        # Least-squares duration of each event from the particles in free flight
+        velocity = before[:, :, VX:VY + 1]
+        displacement = particles[:, :, X:X + 2] - before[:, :, X:X + 2]
+        free = ~changed
+        numerator = np.sum(free * np.einsum('cnk,cnk->cn', velocity, displacement), axis=1)
+        denominator = np.sum(free * np.einsum('cnk,cnk->cn', velocity, velocity), axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dt = np.where(denominator > 0, numerator / denominator, chunk.times - before_times)
+        if offset == 0:
+            dt[0] = 0.0
+
+        count = changed.sum(axis=1)
+        event_type = np.full(len(count), MULTIPLE, dtype=np.int8)
+        event_type[count == 0] = NONE
+        event_type[count == 2] = PARTICLE_PARTICLE
+        single = count == 1
+        event_type[single] = np.where(chunk.total_collisions[single] > before_total[single], OBSTACLE, WALL)
+        if offset == 0:
+            event_type[0] = NONE
+
+        frame, particle = np.nonzero(changed)
+        headers.append(np.stack([chunk.times, chunk.wall_pressure, chunk.obstacle_pressure,
+                                 chunk.first_time_collisions, chunk.total_collisions], axis=1))
+        times.append(dt)
+        types.append(event_type)
+        frames.append(frame + offset)
+        ids.append(particle)
+        states.append(particles[frame, particle, X:VY + 1])
+
+        previous = (particles[-1], chunk.times[-1], chunk.total_collisions[-1])
+        offset += len(particles)
+
+    if previous is None:
+        raise ValueError("Nothing to encode.")
+    header = np.concatenate(headers)
+    return {
+        'header': header,
+        'event_times': header[0, 0] + np.cumsum(np.concatenate(times)),
+        'event_type': np.concatenate(types),
+        'change_frame': np.concatenate(frames).astype(np.int32),
+        'change_id': np.concatenate(ids).astype(np.int32),
+        'change_state': np.concatenate(states),
+        'radius': radius,
+        'mass': mass,
+    }
+
+
+def convert(filename, output=None, chunk_frames=1024):
+    """Convert a text output file to the delta format, streaming it chunk by chunk"""
+    output = output or delta_path(filename)
+    with open(output, 'wb') as f:
+        np.savez(f, **encode(iter_frame_chunks(filename, chunk_frames)))
+    return output
+
+
+class DeltaTrajectory:
+    """Reader of .delta.npz files that rebuilds full frames only for the ranges asked for"""
+
+    def __init__(self, filename):
+        with np.load(filename) as archive:
+            self.header = archive['header']
+            self.event_times = archive['event_times']
+            self.event_type = archive['event_type']
+            self.change_frame = archive['change_frame']
+            self.change_id = archive['change_id']
+            self.change_state = archive['change_state']
+            self.radius = archive['radius']
+            self.mass = archive['mass']
+
+    @property
+    def n(self):
+        return len(self.radius)
+
+    @property
+    def frames(self):
+        return len(self.header)
+
+    def anchors(self, frame):
+        """Index of each particle's last change at or before frame"""
+        end = np.searchsorted(self.change_frame, frame, side='right')
+        anchors = np.zeros(self.n, dtype=np.int64)
+        np.maximum.at(anchors, self.change_id[:end], np.arange(end))
+        return anchors
+
+    def chunk(self, start, stop, anchors=None, particles=None):
+        """
+        Frames [start, stop) as SimulationData, plus the anchors after stop - 1 to
+        continue from. anchors are those before start (computed when not given).
+        particles restricts the rebuilt frames to those particle ids.
+        """
+        stop = min(stop, self.frames)
+        count = stop - start
+        if anchors is None:
+            anchors = self.anchors(start - 1) if start > 0 else np.zeros(self.n, dtype=np.int64)
+        ids = np.arange(self.n) if particles is None else np.asarray(particles)
+        if count <= 0:
+            # Empty range, as the text reader returns it; the anchors carry over unchanged
+            return self._data(self.header[:0], np.empty((0, len(ids), 6))), anchors
+        column = np.full(self.n, -1)
+        column[ids] = np.arange(len(ids))
+
+        lo, hi = np.searchsorted(self.change_frame, [start, stop])
+        changes = np.arange(lo, hi)
+        wanted = column[self.change_id[lo:hi]] >= 0
+        table = np.full((count, len(ids)), -1, dtype=np.int64)
+        table[self.change_frame[lo:hi][wanted] - start, column[self.change_id[lo:hi][wanted]]] = changes[wanted]
+        table[0] = np.maximum(table[0], anchors[ids])
+        # Change indices grow with the frame, so the running max is the latest change
+        np.maximum.accumulate(table, axis=0, out=table)
+        following = anchors.copy()
+        np.maximum.at(following, self.change_id[lo:hi], changes)
+
+        state = self.change_state[table]
+        elapsed = self.event_times[start:stop, None] - self.event_times[self.change_frame[table]]
+        state[..., 0:2] += state[..., 2:4] * elapsed[..., None]
+
+        particles = np.empty((count, len(ids), 6))
+        particles[..., X:VY + 1] = state
+        particles[..., RADIUS] = self.radius[ids]
+        particles[..., MASS] = self.mass[ids]
+        return self._data(self.header[start:stop], particles), following
+
+    @staticmethod
+    def _data(header, particles):
+        return SimulationData(
+            times=header[:, 0],
+            wall_pressure=header[:, 1],
+            obstacle_pressure=header[:, 2],
+            first_time_collisions=header[:, 3].astype(np.int64),
+            total_collisions=header[:, 4].astype(np.int64),
+            particles=particles,
+        )
+
+    def iter_chunks(self, chunk_frames=1024):
+        anchors = None
+        for start in range(0, self.frames, chunk_frames):
+            data, anchors = self.chunk(start, start + chunk_frames, anchors)
+            yield data
+
+    def data(self):
+        return self.chunk(0, self.frames)[0]
+
+
+def check_against_text(filename, output, tolerance=1e-5):
+    """
+    Compare the delta file output with its source text file through query, on
+    empty, partial and full frame ranges and on time windows outside the run.
+    Returns the ranges that differ (empty when they all match).
+    """
+    from query import query
+    frames = len(query(filename).times)
+    windows = [
+        {'frames': slice(0, 0)}, {'frames': slice(5, 5)}, {'frames': slice(frames, frames + 3)},
+        {'frames': slice(3, 10)}, {'frames': slice(frames - 4, frames + 2)}, {'frames': slice(0, frames)},
+        {'t_min': -5.0, 't_max': -1.0},
+    ]
+    mismatches = []
+    for window in windows:
+        text = query(filename, scalars=('total_collisions',), fields=('x', 'y', 'vx', 'vy'), **window)
+        delta = query(output, scalars=('total_collisions',), fields=('x', 'y', 'vx', 'vy'), **window)
+        same = text.particles.shape == delta.particles.shape \
+            and np.array_equal(text.times, delta.times) \
+            and np.array_equal(text.total_collisions, delta.total_collisions) \
+            and np.allclose(text.particles, delta.particles, rtol=0, atol=tolerance)
+        if not same:
+            mismatches.append(window)
+    return mismatches
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python delta.py [--check] <simulation_file1> <simulation_file2> ...")
+        sys.exit(1)
+    # --check: compare every converted file with its text source on empty and partial ranges
+    check = '--check' in sys.argv
+    for filename in [arg for arg in sys.argv[1:] if arg != '--check']:
+        output = convert(filename)
+        print(f"{filename} -> {output}")
+        if check:
+            mismatches = check_against_text(filename, output)
+            print("  coincide con el texto" if not mismatches else f"  difiere en {mismatches}")
+            if mismatches:
+                sys.exit(1)
@@ -0,0 +1,57 @@
+import numpy as np
+
+# Reduce long time series to what a figure can show. minmax keeps, for every
+# pixel-wide bucket of x, the first, last, lowest and highest sample (M4), which
+# draws the same line as the full series at that width. lttb
+# (Largest-Triangle-Three-Buckets) keeps one point per bucket, the one that
+# spans the largest triangle with its neighbours, for a smoother line with
+# fewer points.
+DEFAULT_POINTS = 2000
+
+
+def minmax_downsample(x, y, buckets=DEFAULT_POINTS):
+    """At most 4 points per bucket of equal x width, in their original order"""
+    x, y = np.asarray(x), np.asarray(y)
+    if len(x) <= 4 * buckets:
+        return x, y
+    edges = np.linspace(x[0], x[-1], buckets + 1)
+    bucket = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, buckets - 1)
+
+    # Samples are in x order, so buckets are contiguous runs
+    starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    ends = np.append(starts[1:], len(x)) - 1
+    # Within each bucket, the lowest y comes first and the highest last
+    order = np.lexsort((y, bucket))
+    lowest, highest = order[starts], order[ends]
+    keep = np.unique(np.concatenate([starts, ends, lowest, highest]))
+    return x[keep], y[keep]
+
+
+def lttb(x, y, points=DEFAULT_POINTS):
+    """points samples chosen by Largest-Triangle-Three-Buckets, first and last kept"""
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    if points >= len(x) or points < 3:
+        return x, y
+    edges = np.linspace(1, len(x) - 1, points - 1).astype(np.int64)
+    keep = np.empty(points, dtype=np.int64)
+    keep[0], keep[-1] = 0, len(x) - 1
+    selected = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        following = slice(edges[i + 1], edges[i + 2] if i + 2 < len(edges) else len(x))
+        mean_x, mean_y = x[following].mean(), y[following].mean()
+        # Twice the triangle area with the previous point and the next bucket's mean
+        area = np.abs((x[selected] - mean_x) * (y[start:end] - y[selected])
+                      - (x[selected] - x[start:end]) * (mean_y - y[selected]))
+        selected = start + int(np.argmax(area))
+        keep[i + 1] = selected
+    return x[keep], y[keep]
+
+
+def downsample(x, y, points=DEFAULT_POINTS, method='minmax'):
+    """x, y reduced to about points samples with minmax (points / 4 buckets) or lttb"""
+    if method == 'lttb':
+        return lttb(x, y, points)
+    if method == 'minmax':
+        return minmax_downsample(x, y, max(points // 4, 1))
+    raise ValueError(f"Unknown downsampling method {method!r}, expected 'minmax' or 'lttb'.")
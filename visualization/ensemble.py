@@ -0,0 +1,133 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+BOOTSTRAP_CHUNK = 250
+
+
+def ensemble_squared_displacements(times, all_positions, common_times):
+    """
+    runs x points squared displacement of every run from its first recorded
+    position, evaluated at common_times for all runs in one batched pass.
+
+    The runs are concatenated into one ragged array, each sorted by time, and
+    shifted onto disjoint key ranges so a single searchsorted finds the frame
+    of every (run, time) pair. Positions are frames x 2 (x, y), or frames x 4
+    (x, y, vx, vy) of which only x, y are used, linearly interpolated like
+    np.interp: times outside a run's range take its first or last position.
+    """
+    common_times = np.asarray(common_times, dtype=np.float64)
+    num_runs = len(times)
+    lengths = np.array([len(t) for t in times])
+    result = np.zeros((num_runs, len(common_times)))
+    if lengths.sum() == 0:
+        return result
+
+    flat_times = np.concatenate([np.asarray(t, dtype=np.float64) for t in times])
+    flat_positions = np.concatenate([np.asarray(p, dtype=np.float64)[:, 0:2] for p in all_positions if len(p)])
+
+    run_ids = np.repeat(np.arange(num_runs), lengths)
+    order = np.lexsort((flat_times, run_ids))
+    flat_times = flat_times[order]
+    flat_positions = flat_positions[order]
+
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    base = min(flat_times.min(), common_times.min())
+    stride = max(flat_times.max(), common_times.max()) - base + 1.0
+    keys = run_ids * stride + (flat_times - base)
+    query_keys = np.arange(num_runs)[:, None] * stride + (common_times - base)[None, :]
+
+    present = lengths > 0
+    last = np.maximum(ends - 1, starts)
+    index = np.searchsorted(keys, query_keys, side='right') - 1
+    index = np.clip(index, starts[:, None], last[:, None])
+    index[~present] = 0
+
+    following = np.minimum(index + 1, last[:, None])
+    t0, t1 = flat_times[index], flat_times[following]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(t1 > t0, (common_times[None, :] - t0) / (t1 - t0), 0.0)
+    weight = np.clip(weight, 0.0, 1.0)[..., None]
+    positions = (1 - weight) * flat_positions[index] + weight * flat_positions[following]
+
+    initial = flat_positions[np.where(present, starts, 0)]
+    result = np.sum((positions - initial[:, None, :]) ** 2, axis=-1)
+    result[~present] = 0.0
+    return result
+
+
+def fit_diffusion_coefficients(common_times, msd_curves, dimension=2, t_min=0.05, t_max=0.2):
+    """
+    Least-squares slope of each row of msd_curves over [t_min, t_max], as
+    estimate_diffusion_coefficient does with linregress, and D = slope / (2 dimension).
+    """
+    mask = (common_times >= t_min) & (common_times <= t_max)
+    t = common_times[mask]
+    msd = np.atleast_2d(msd_curves)[:, mask]
+    t_centered = t - t.mean()
+    slopes = (msd - msd.mean(axis=1, keepdims=True)) @ t_centered / np.sum(t_centered ** 2)
+    return slopes / (2 * dimension)
+
+
+def _bootstrap_chunk(squared_displacements, common_times, samples, seed, dimension, t_min, t_max):
+    rng = np.random.default_rng(seed)
+    num_runs = squared_displacements.shape[0]
+    # Resampling runs with replacement is a weighted mean of the per-run curves,
+    # with multinomial counts as weights
+    counts = rng.multinomial(num_runs, np.full(num_runs, 1 / num_runs), size=samples)
+    curves = counts @ squared_displacements / num_runs
+    return curves, fit_diffusion_coefficients(common_times, curves, dimension, t_min, t_max)
+
+
+def bootstrap_dcm(times, all_positions, start_time=0.05, num_points=50, samples=1000, confidence=0.95,
+                  workers=None, seed=None, dimension=2, t_min=0.05, t_max=0.2):
+    """
+    Bootstrap over runs of compute_dcm's average MSD and of the fitted D.
+    Samples are split in chunks across a process pool; given a seed the result
+    does not depend on the number of workers.
+
+    Returns the MSD DataFrame of compute_dcm with ci_low/ci_high columns, and a
+    dict with D (from the full ensemble) and its D_ci_low/D_ci_high.
+    """
+    if sum(len(t) for t in times) == 0:
+        raise ValueError("At least one run with data is needed to bootstrap.")
+    min_time = min(np.min(t) for t in times if len(t))
+    max_time = max(np.max(t) for t in times if len(t))
+    common_times = np.linspace(max(start_time, min_time), max_time, num_points)
+    squared_displacements = ensemble_squared_displacements(times, all_positions, common_times)
+
+    # Fixed-size chunks with their own seeds keep the result independent of the worker count
+    sizes = [min(BOOTSTRAP_CHUNK, samples - start) for start in range(0, samples, BOOTSTRAP_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    arguments = [(squared_displacements, common_times, size, chunk_seed, dimension, t_min, t_max)
+                 for size, chunk_seed in zip(sizes, seeds)]
+
+    workers = min(workers or os.cpu_count() or 1, len(sizes))
+    if workers == 1:
+        results = [_bootstrap_chunk(*chunk_arguments) for chunk_arguments in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_bootstrap_chunk, *zip(*arguments)))
+
+    curves = np.concatenate([curve for curve, _ in results])
+    coefficients = np.concatenate([d for _, d in results])
+    alpha = (1 - confidence) / 2
+
+    msd_df = pd.DataFrame({
+        'time': common_times,
+        'average_msd': np.mean(squared_displacements, axis=0),
+        'std_deviation': np.std(squared_displacements, axis=0),
+        'ci_low': np.quantile(curves, alpha, axis=0),
+        'ci_high': np.quantile(curves, 1 - alpha, axis=0),
+    })
+    d = fit_diffusion_coefficients(common_times, msd_df['average_msd'].values, dimension, t_min, t_max)[0]
+    return msd_df, {
+        'D': d,
+        'D_ci_low': np.quantile(coefficients, alpha),
+        'D_ci_high': np.quantile(coefficients, 1 - alpha),
+        'samples': samples,
+        'confidence': confidence,
+    }
@@ -0,0 +1,156 @@
+import mmap
+import os
+
+import numpy as np
+
+from reader import HEADER_LINES, from_block, frame_size
+
+# Byte offset of every frame of a text output, so a time window or a stride of
+# frames can be decoded straight from a memory map of the file. Sidecar next to
+# each output-N-V.txt:
+#   output-N-V.txt.index.npz   n, offsets (frames + 1, the last one is the end of
+#                              the last complete frame), times, source size/mtime
+INDEX_SUFFIX = '.index.npz'
+SCAN_BYTES = 1 << 26
+
+
+def index_path(filename):
+    return filename + INDEX_SUFFIX
+
+
+def _source_stamp(filename):
+    stat = os.stat(filename)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def build_index(filename):
+    """
+    Offsets and times of the complete frames of filename. Newlines are found in
+    blocks of the memory-mapped file, and only the time line of each frame is parsed.
+    """
+    with open(filename, 'rb') as f:
+        n = int(f.readline())
+        size = os.fstat(f.fileno()).st_size
+        period = HEADER_LINES + n
+        starts = []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buffer = np.frombuffer(mm, dtype=np.uint8)
+            lines = 0
+            for block in range(0, size, SCAN_BYTES):
+                newlines = np.flatnonzero(buffer[block:block + SCAN_BYTES] == ord('\n')) + block
+                # The newline that ends line k * period (0-based) opens frame k
+                first = (-lines) % period
+                starts.append(newlines[first::period] + 1)
+                lines += len(newlines)
+            del buffer
+            offsets = np.concatenate(starts) if starts else np.zeros(1, dtype=np.int64)
+            # The last start opens a frame that may not be complete yet
+            frames = len(offsets) - 1
+            time_lines = b' '.join(mm[offsets[k]:mm.find(b'\n', offsets[k])] for k in range(frames))
+    times = np.fromstring(time_lines, dtype=np.float64, sep=' ') if frames else np.empty(0)
+    return {'n': np.int64(n), 'offsets': offsets.astype(np.int64), 'times': times}
+
+
+def write_index(filename, index):
+    """Write the sidecar atomically, stamped with the source it describes"""
+    path = index_path(filename)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, source=_source_stamp(filename), **index)
+    os.replace(tmp, path)
+
+
+def load_index(filename):
+    """The index of filename from its sidecar, rebuilt (and rewritten) whenever the source changed"""
+    try:
+        with np.load(index_path(filename)) as sidecar:
+            if np.array_equal(sidecar['source'], _source_stamp(filename)):
+                return {key: sidecar[key] for key in ('n', 'offsets', 'times')}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    stamp = _source_stamp(filename)
+    index = build_index(filename)
+    if np.array_equal(stamp, _source_stamp(filename)):
+        try:
+            write_index(filename, index)
+        except OSError:
+            # Read-only location: keep the index in memory only
+            pass
+    return index
+
+
+def frame_range(times, t_min=None, t_max=None):
+    """
+    (start, stop) of the frames in effect during [t_min, t_max]: the last frame
+    at or before t_min is included, since it holds the state at t_min.
+    """
+    start = 0 if t_min is None else max(int(np.searchsorted(times, t_min, side='right')) - 1, 0)
+    stop = len(times) if t_max is None else int(np.searchsorted(times, t_max, side='right'))
+    return start, max(stop, start)
+
+
+class IndexedFile:
+    """
+    Random access to the frames of a text output through its frame index. Only
+    the bytes of the requested frames are read and parsed, so the cost of a
+    query is proportional to the slice and not to the file.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        index = load_index(filename)
+        self.n = int(index['n'])
+        self.offsets = index['offsets']
+        self.times = index['times']
+        self._file = open(filename, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.frames else None
+
+    @property
+    def frames(self):
+        return len(self.times)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read(self, start=0, stop=None, step=1, particles=None):
+        """
+        Frames start:stop:step as SimulationData. With particles, only the header
+        and the first particles particle lines of each frame are decoded.
+        """
+        selected = np.arange(self.frames)[start:stop:step]
+        if particles is None or particles >= self.n:
+            particles = self.n
+            if step == 1 and len(selected):
+                text = self._mm[self.offsets[selected[0]]:self.offsets[selected[-1] + 1]]
+            else:
+                text = b' '.join(self._mm[self.offsets[k]:self.offsets[k + 1]] for k in selected)
+        elif len(selected):
+            # Locate line ends with one scan of the slice, then cut each frame's prefix
+            base = self.offsets[selected[0]]
+            buffer = np.frombuffer(self._mm, dtype=np.uint8, count=self.offsets[selected[-1] + 1] - base, offset=base)
+            newlines = np.flatnonzero(buffer == ord('\n')) + base
+            del buffer
+            period = HEADER_LINES + self.n
+            ends = newlines[(selected - selected[0]) * period + HEADER_LINES + particles - 1]
+            text = b' '.join(self._mm[self.offsets[k]:end] for k, end in zip(selected, ends))
+        else:
+            text = b''
+        values = np.fromstring(text, dtype=np.float64, sep=' ') if len(selected) else np.empty(0)
+        return from_block(particles, values.reshape(len(selected), frame_size(particles)))
+
+    def frame_range(self, t_min=None, t_max=None):
+        return frame_range(self.times, t_min, t_max)
+
+    def read_time_range(self, t_min=None, t_max=None, step=1):
+        """Every step-th frame in effect during [t_min, t_max] as SimulationData"""
+        start, stop = self.frame_range(t_min, t_max)
+        return self.read(start, stop, step)
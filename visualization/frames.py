@@ -0,0 +1,158 @@
+import threading
+
+import numpy as np
+
+from cache import has_valid_cache, load_simulation_file, write_cache
+from reader import DELTA_SUFFIX, HEADER_COLUMNS, RADIUS, SimulationData, VY, X, Y, follow_frames, iter_frame_chunks
+
+
+class FrameSource:
+    """
+    Random access to the frames of an output file while it is still being decoded.
+
+    With a valid cache sidecar every frame is available at once from the memory
+    map, and a delta file is decoded up front. Otherwise a background thread
+    decodes the text in chunks into growing buffers, so the first frames can be
+    shown right away; once it finishes the sidecar is written for next time. With follow=True the thread keeps tailing
+    the file while the simulation appends to it. Frame lookups are O(1) array indexing and
+    time lookups a binary search over the decoded times.
+    """
+
+    def __init__(self, filename, chunk_frames=256, write_sidecar=True, follow=False, poll_interval=0.5):
+        self.filename = filename
+        self.chunk_frames = chunk_frames
+        # A followed file is still growing, caching it would be stale immediately
+        self.write_sidecar = write_sidecar and not follow
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.error = None
+        self._lock = threading.Lock()
+        self._loaded = threading.Condition(self._lock)
+        self._count = 0
+
+        if not follow and (filename.endswith(DELTA_SUFFIX) or has_valid_cache(filename)):
+            data = load_simulation_file(filename)
+            self._header = np.stack([
+                data.times, data.wall_pressure, data.obstacle_pressure,
+                data.first_time_collisions, data.total_collisions,
+            ], axis=1)
+            self._particles = data.particles
+            self._count = data.frames
+            self.complete = True
+            self._thread = None
+        else:
+            self._header = None
+            self._particles = None
+            self.complete = False
+            self._thread = threading.Thread(target=self._decode, daemon=True)
+            self._thread.start()
+
+    def _append(self, chunk):
+        frames = chunk.frames
+        with self._lock:
+            if self._particles is None:
+                self._header = np.empty((max(frames, 1024), len(HEADER_COLUMNS)))
+                self._particles = np.empty((max(frames, 1024),) + chunk.particles.shape[1:])
+            elif self._count + frames > len(self._particles):
+                # Grow by doubling; readers keep whatever buffer they already hold
+                capacity = max(2 * len(self._particles), self._count + frames)
+                header = np.empty((capacity, len(HEADER_COLUMNS)))
+                particles = np.empty((capacity,) + self._particles.shape[1:])
+                header[:self._count] = self._header[:self._count]
+                particles[:self._count] = self._particles[:self._count]
+                self._header, self._particles = header, particles
+
+            end = self._count + frames
+            self._header[self._count:end] = np.stack([
+                chunk.times, chunk.wall_pressure, chunk.obstacle_pressure,
+                chunk.first_time_collisions, chunk.total_collisions,
+            ], axis=1)
+            self._particles[self._count:end] = chunk.particles
+            self._count = end
+            self._loaded.notify_all()
+
+    def _decode(self):
+        try:
+            if self.follow:
+                chunks = follow_frames(self.filename, self.chunk_frames, self.poll_interval)
+            else:
+                chunks = iter_frame_chunks(self.filename, self.chunk_frames)
+            for chunk in chunks:
+                self._append(chunk)
+            if self.write_sidecar and self._count:
+                write_cache(self.filename, self.data())
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._lock:
+                self.complete = True
+                self._loaded.notify_all()
+
+    def wait(self, frames=1, timeout=None):
+        """Block until at least frames frames are decoded (or decoding ends); returns the count"""
+        with self._loaded:
+            self._loaded.wait_for(lambda: self._count >= frames or self.complete, timeout)
+            return self._count
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def n(self):
+        return None if self._particles is None else self._particles.shape[1]
+
+    def _snapshot(self):
+        # Buffers and count must be read together: a grown buffer replaces the old one
+        with self._lock:
+            return self._header, self._particles, self._count
+
+    @property
+    def times(self):
+        header, _, count = self._snapshot()
+        return header[:count, 0] if count else np.empty(0)
+
+    def data(self):
+        """SimulationData view of the frames decoded so far"""
+        header, particles, count = self._snapshot()
+        return SimulationData(
+            times=header[:count, 0],
+            wall_pressure=header[:count, 1],
+            obstacle_pressure=header[:count, 2],
+            first_time_collisions=header[:count, 3].astype(np.int64),
+            total_collisions=header[:count, 4].astype(np.int64),
+            particles=particles[:count],
+        )
+
+    def frame(self, index):
+        """(time, N x 6 particles) of a decoded frame"""
+        header, particles, count = self._snapshot()
+        if not 0 <= index < count:
+            raise IndexError(f"Frame {index} is not decoded yet ({count} available).")
+        return header[index, 0], particles[index]
+
+    def index_at_time(self, t):
+        """Index of the last decoded frame at or before t"""
+        times = self.times
+        return max(int(np.searchsorted(times, t, side='right')) - 1, 0)
+
+    def state_at_time(self, t):
+        """
+        N x 4 (x, y, vx, vy) at time t, positions interpolated linearly between
+        the decoded frames around it (see resample.py); past the last decoded
+        frame, that frame's state
+        """
+        header, particles, count = self._snapshot()
+        if not count:
+            raise IndexError("No frame is decoded yet.")
+        times = header[:count, 0]
+        index = max(int(np.searchsorted(times, t, side='right')) - 1, 0)
+        state = np.array(particles[index, :, X:VY + 1])
+        following = min(index + 1, count - 1)
+        if times[following] > times[index]:
+            weight = min(max((t - times[index]) / (times[following] - times[index]), 0.0), 1.0)
+            state[:, 0:2] += weight * (particles[following, :, X:Y + 1] - state[:, 0:2])
+        return state
+
+    def radius(self):
+        """Per-particle radius, constant over the run"""
+        return np.array(self.frame(0)[1][:, RADIUS])
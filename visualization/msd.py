@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from resample import resample_positions, uniform_times
+
+
+def msd_fft(positions):
+    """
+    Mean squared displacement of evenly sampled trajectories averaged over every
+    time origin, via the Wiener-Khinchin theorem in O(T log T):
+
+        MSD(m) = 1/(T-m) sum_k |r(k+m) - r(k)|^2 = S1(m) - 2 S2(m)
+
+    with S1 built from prefix sums of |r|^2 and S2 the position autocorrelation.
+    positions is T x d or T x P x d; the result is T or T x P, one value per lag.
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    # The MSD is translation invariant; centering keeps S1 and 2 S2 from cancelling badly
+    positions = positions - positions.mean(axis=0)
+    T = positions.shape[0]
+    counts = (T - np.arange(T)).reshape((-1,) + (1,) * (positions.ndim - 2))
+
+    squared = np.sum(positions ** 2, axis=-1)
+    prefix = np.concatenate([np.zeros((1,) + squared.shape[1:]), np.cumsum(squared, axis=0)])
+    lags = np.arange(T)
+    s1 = (prefix[T - lags] + prefix[T] - prefix[lags]) / counts
+
+    # Zero padding to 2T turns the circular correlation into a linear one
+    spectrum = np.fft.rfft(positions, n=2 * T, axis=0)
+    autocorrelation = np.fft.irfft(spectrum * spectrum.conj(), n=2 * T, axis=0)[:T]
+    s2 = np.sum(autocorrelation, axis=-1) / counts
+
+    return np.maximum(s1 - 2 * s2, 0)
+
+
+def particle_msd(times, states, dt, particles=None, chunk_particles=64, max_lag=None):
+    """
+    All-origins MSD of each selected particle, resampled every dt seconds.
+    states is frames x N x 4 (x, y, vx, vy); particles are processed in chunks of
+    chunk_particles so only one chunk of resampled trajectories is in memory.
+    Returns the lag times and a lags x P array.
+    """
+    query_times = uniform_times(times, dt)
+    particles = np.arange(states.shape[1]) if particles is None else np.atleast_1d(particles)
+    lags = len(query_times) if max_lag is None else min(max_lag, len(query_times))
+
+    result = np.empty((lags, len(particles)))
+    for start in range(0, len(particles), chunk_particles):
+        chunk = particles[start:start + chunk_particles]
+        positions = resample_positions(times, states[:, chunk], query_times)
+        result[:, start:start + len(chunk)] = msd_fft(positions)[:lags]
+    return dt * np.arange(lags), result
+
+
+def msd_dataframe(lag_times, msd):
+    """Average and spread over the columns of a lags x P MSD array, in compute_dcm's format"""
+    return pd.DataFrame({
+        'time': lag_times,
+        'average_msd': np.mean(msd, axis=1),
+        'std_deviation': np.std(msd, axis=1),
+    })
+
+
+def ensemble_msd(all_times, all_states, dt, particle=0):
+    """
+    All-origins MSD of one particle (the big one by default) averaged over several
+    runs, truncated to the shortest run; std_deviation is the spread between runs.
+    Each states entry is frames x N x 4, or frames x 4 for an already selected particle.
+    """
+    curves = []
+    for times, states in zip(all_times, all_states):
+        if states.ndim == 2:
+            states, index = states[:, None, :], 0
+        else:
+            index = particle
+        curves.append(particle_msd(times, states, dt, particles=index)[1][:, 0])
+    lags = min(len(curve) for curve in curves)
+    return msd_dataframe(dt * np.arange(lags), np.stack([curve[:lags] for curve in curves], axis=1))
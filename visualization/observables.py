@@ -2,66 +2,178 @@ import os
 import sys
 import pandas as pd
 import numpy as np
+import matplotlib
 import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 from matplotlib.ticker import ScalarFormatter
+from cache import load_simulation_file, load_simulation_files
+from downsample import DEFAULT_POINTS, downsample
+from pressure import WindowedPressure, pressure_estimate
+from profiling import enable_from_args, file_bytes, profiled, stage
+from query import SCALARS, query_files
+from summary import SummaryStore
+from table import ParticleTable, ParticleTableSet
+from streaming import CollisionSeries, PressureSeries, TemperatureAccumulator, follow_observables, stream_observables
+
+def simulation_dataframes(data):
+    df_pressure = pd.DataFrame({
+        'time': data.times,
+        'wallPressure': data.wall_pressure,
+        'obstaclePressure': data.obstacle_pressure,
+    })
+    df_obstacle_collisions = pd.DataFrame({
+        'time': data.times,
+        'firstTimeCollisions': data.first_time_collisions,
+        'totalCollisions': data.total_collisions,
+    })
+    return df_pressure, df_obstacle_collisions
 
 def parse_simulation_file(file_path):
-    pressure_data = []
-    particle_data = []
-    collision_data = []
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-        i = 0
-        n = int(lines[i].strip())
-        i += 1
-
-        while i < len(lines):
-            t = float(lines[i].strip())
-            i += 1
-            wallPressure = float(lines[i].strip())
-            i += 1
-            obstaclePressure = float(lines[i].strip())
-            i += 1
-            # temperature = float(lines[i].strip())
-            # i += 1
-            firstTimeCollisions = int(lines[i].strip())
-            i += 1
-            totalCollisions = int(lines[i].strip())
-            i += 1
-            # pressure_data.append([t, wallPressure, obstaclePressure, temperature])
-            pressure_data.append([t, wallPressure, obstaclePressure])
-
-            collision_data.append([t, firstTimeCollisions, totalCollisions])
-            for _ in range(n):
-                x, y, vx, vy, r, m = map(float, lines[i].strip().split())
-                particle_data.append([t, x, y, vx, vy, r, m])
-                i += 1
-
-    # df_pressure = pd.DataFrame(pressure_data, columns=['time', 'wallPressure', 'obstaclePressure', 'temperature'])
-    df_pressure = pd.DataFrame(pressure_data, columns=['time', 'wallPressure', 'obstaclePressure'])
-    df_obstacle_collisions = pd.DataFrame(collision_data, columns=['time', 'firstTimeCollisions', 'totalCollisions'])
-    df_particles = pd.DataFrame(particle_data, columns=['time', 'x', 'y', 'vx', 'vy', 'radius', 'mass'])
-    return df_pressure, df_obstacle_collisions, df_particles
-
-def parse_multiple_simulation_files(files):
+    """Particles come back as a ParticleTable; call .to_dataframe() for the long format"""
+    data = load_simulation_file(file_path)
+    df_pressure, df_obstacle_collisions = simulation_dataframes(data)
+    return df_pressure, df_obstacle_collisions, ParticleTable.from_simulation_data(data, name=file_path)
+
+def parse_multiple_simulation_files(files, workers=None):
+    """Particles come back as a ParticleTableSet; call .to_dataframe() for the long format"""
+    df_pressure_list = []
+    df_obstacle_collisions_list = []
+
+    with stage('parse') as parse:
+        datas = load_simulation_files(files, workers)
+        parse.add(frames=sum(data.frames for data in datas), bytes_read=file_bytes(files))
+
+    with stage('dataframes'):
+        for f, data in zip(files, datas):
+            pressure, collisions = simulation_dataframes(data)
+            pressure['simulation'] = f
+            collisions['simulation'] = f
+            df_pressure_list.append(pressure)
+            df_obstacle_collisions_list.append(collisions)
+
+        df_pressure = pd.concat(df_pressure_list, ignore_index=True)
+        df_obstacle_collisions = pd.concat(df_obstacle_collisions_list, ignore_index=True)
+
+    with stage('particle_tables'):
+        particles = ParticleTableSet.from_simulation_data(files, datas)
+
+    return df_pressure, df_obstacle_collisions, particles
+
+
+def parse_simulation_headers(files, workers=None):
+    """df_pressure and df_obstacle_collisions of every file, decoding only the header scalars"""
+    df_pressure_list = []
+    df_obstacle_collisions_list = []
+
+    with stage('parse') as parse:
+        projections = query_files(files, workers, scalars=SCALARS)
+        parse.add(frames=sum(p.frames for p in projections), bytes_read=sum(p.nbytes for p in projections))
+
+    with stage('dataframes'):
+        for f, projection in zip(files, projections):
+            pressure, collisions = simulation_dataframes(projection)
+            pressure['simulation'] = f
+            collisions['simulation'] = f
+            df_pressure_list.append(pressure)
+            df_obstacle_collisions_list.append(collisions)
+
+        df_pressure = pd.concat(df_pressure_list, ignore_index=True)
+        df_obstacle_collisions = pd.concat(df_obstacle_collisions_list, ignore_index=True)
+
+    return df_pressure, df_obstacle_collisions
+
+
+def parse_simulation_file_streaming(file_path, chunk_frames=1024):
+    """
+    Builds df_pressure (with a per-frame temperature column) and df_obstacle_collisions
+    without ever holding the particle table; memory is bounded by chunk_frames.
+    """
+    pressure, collisions, temperature = stream_observables(
+        file_path, [PressureSeries(), CollisionSeries(), TemperatureAccumulator()], chunk_frames
+    )
+    times, wall_pressure, obstacle_pressure = pressure.result()
+    _, first_time_collisions, total_collisions = collisions.result()
+
+    df_pressure = pd.DataFrame({
+        'time': times,
+        'wallPressure': wall_pressure,
+        'obstaclePressure': obstacle_pressure,
+        'temperature': temperature.series(),
+    })
+    df_obstacle_collisions = pd.DataFrame({
+        'time': times,
+        'firstTimeCollisions': first_time_collisions,
+        'totalCollisions': total_collisions,
+    })
+    return df_pressure, df_obstacle_collisions, temperature
+
+def parse_multiple_simulation_files_streaming(files, chunk_frames=1024):
     df_pressure_list = []
     df_obstacle_collisions_list = []
-    df_particles_list = []
 
     for f in files:
-        pressure, collisions, particles = parse_simulation_file(f)
+        with stage('parse', bytes_read=file_bytes([f])) as parse:
+            pressure, collisions, _ = parse_simulation_file_streaming(f, chunk_frames)
+            parse.add(frames=len(pressure))
         pressure['simulation'] = f
         collisions['simulation'] = f
-        particles['simulation'] = f
         df_pressure_list.append(pressure)
         df_obstacle_collisions_list.append(collisions)
-        df_particles_list.append(particles)
 
     df_pressure = pd.concat(df_pressure_list, ignore_index=True)
     df_obstacle_collisions = pd.concat(df_obstacle_collisions_list, ignore_index=True)
-    df_particles = pd.concat(df_particles_list, ignore_index=True)
 
-    return df_pressure, df_obstacle_collisions, df_particles
+    return df_pressure, df_obstacle_collisions
+
+
+def monitor_simulation_file(file_path, poll_interval=1.0, chunk_frames=256, block_time=1e-3, tolerance=0.01):
+    """
+    Live pressure, collision and temperature plots of a run that is still being
+    written; every refresh only decodes and accumulates the newly appended frames.
+    The block-averaged wall pressure reports when it has converged to tolerance,
+    at which point the run can be stopped.
+    """
+    pressure, collisions, temperature = PressureSeries(), CollisionSeries(), TemperatureAccumulator()
+    wall_blocks = WindowedPressure(block_time, 'wall_pressure')
+
+    plt.ion()
+    fig, (ax_pressure, ax_collisions, ax_temperature) = plt.subplots(3, 1, sharex=True, figsize=(10, 9))
+    wall_line, = ax_pressure.plot([], [], label='Presión Pared', color='blue')
+    obstacle_line, = ax_pressure.plot([], [], label='Presión Obstaculo', color='red')
+    first_line, = ax_collisions.plot([], [], label='Colisiones (primeras)')
+    total_line, = ax_collisions.plot([], [], label='Colisiones (acumuladas)')
+    temperature_line, = ax_temperature.plot([], [], label='Temperatura', color='orange')
+    ax_pressure.set_ylabel('Presión [N/m]')
+    ax_collisions.set_ylabel('Colisiones')
+    ax_temperature.set_ylabel('Temperatura')
+    ax_temperature.set_xlabel('Tiempo [s]')
+    for ax in (ax_pressure, ax_collisions, ax_temperature):
+        ax.legend(loc='upper left')
+        ax.grid(True)
+
+    updates = follow_observables(file_path, [pressure, collisions, temperature, wall_blocks], chunk_frames, poll_interval)
+    try:
+        for _ in updates:
+            times, wall_pressure, obstacle_pressure = pressure.result()
+            _, first_time_collisions, total_collisions = collisions.result()
+            wall_line.set_data(times, wall_pressure)
+            obstacle_line.set_data(times, obstacle_pressure)
+            first_line.set_data(times, first_time_collisions)
+            total_line.set_data(times, total_collisions)
+            temperature_line.set_data(times, temperature.series())
+            for ax in (ax_pressure, ax_collisions, ax_temperature):
+                ax.relim()
+                ax.autoscale_view()
+            fig.canvas.draw_idle()
+            plt.pause(0.001)
+            print(f"t = {times[-1]:.4f} s  frames: {len(times)}  "
+                  f"P = {wall_pressure[-1] + obstacle_pressure[-1]:.3e} N/m  "
+                  f"colisiones: {total_collisions[-1]}  T = {temperature.temperature:.3e}")
+            estimate = wall_blocks.estimate()
+            if wall_blocks.converged(tolerance):
+                print(f"Presión pared convergida: {estimate['mean']:.3e} ± {estimate['error']:.1e} N/m")
+    except KeyboardInterrupt:
+        pass
 
 
 def plot_collisions_over_time(df_collisions):
@@ -72,8 +184,8 @@ def plot_collisions_over_time(df_collisions):
     fig_total_collisions, ax_total_collisions = plt.subplots(figsize=(10, 6))
 
     for sim, group in df_by_sim:
-        ax_first_collision.plot(group['time'], group['firstTimeCollisions'], label=f'v = {sim.split("-")[2][:-4]} m/s', alpha=0.5)
-        ax_total_collisions.plot(group['time'], group['totalCollisions'], label=f'v = {sim.split("-")[2][:-4]} m/s', alpha=0.5)
+        ax_first_collision.plot(group['time'], group['firstTimeCollisions'], label=f'v = {sim.split("-")[2].split(".")[0]} m/s', alpha=0.5)
+        ax_total_collisions.plot(group['time'], group['totalCollisions'], label=f'v = {sim.split("-")[2].split(".")[0]} m/s', alpha=0.5)
     
     ax_first_collision.set_xlabel('Tiempo [s]', fontsize=14)
     ax_first_collision.set_ylabel('Número de colisiones (primeras)', fontsize=14)
@@ -99,16 +211,27 @@ def calculate_collision_rate(df_collisions, df_pressure):
     print(f"Tasa de colisión: {collision_rate:.2f} collision/s a Temperatura: {temperature:.2f} K")
 
 
-def plot_collision_rate_over_temperature(df_collisions, df_particles):
+@profiled('temperature')
+def simulation_temperatures(particles):
+    """Temperature of each simulation from a ParticleTableSet or a long-format particle DataFrame"""
+    if isinstance(particles, ParticleTableSet):
+        return particles.temperature().reset_index(drop=True)
+    if isinstance(particles, ParticleTable):
+        return pd.Series([particles.temperature()])
+
+    mass = particles.groupby('simulation')['mass'].mean()
+
+    v_squared = particles['vx']**2 + particles['vy']**2
+    v_squared_stats = v_squared.groupby(particles['simulation']).agg(['mean', 'std']).reset_index()
+    return 0.5 * mass.values * v_squared_stats['mean']
+
+
+def plot_collision_rate_over_temperature(df_collisions, particles):
     
     df_by_sim = df_collisions.groupby('simulation')
     collision_rates = []
     
-    mass = df_particles.groupby('simulation')['mass'].mean()
-
-    df_particles['v_squared'] = df_particles['vx']**2 + df_particles['vy']**2
-    v_squared_stats = df_particles.groupby('simulation')['v_squared'].agg(['mean', 'std']).reset_index()
-    temperature = 0.5 * mass.values * v_squared_stats['mean'] 
+    temperature = simulation_temperatures(particles)
 
     for sim, group in df_by_sim:
         total_time = group['time'].iloc[-1]
@@ -116,14 +239,19 @@ def plot_collision_rate_over_temperature(df_collisions, df_particles):
         collision_rate = total_collisions / total_time
         collision_rates.append(collision_rate)
 
-    plt.figure(figsize=(10, 6))
-    plt.plot(temperature, collision_rates, 'o', label='Tasa de colisiones')
-    plt.xlabel('Temperatura', fontsize=14)
-    plt.ylabel('Tasa de colisiones [collision/s]', fontsize=14)
-    plt.grid(True)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig('observables/collision_rate_over_temperature.png')
+    _plot_collision_rate(temperature, collision_rates)
+
+
+def _plot_collision_rate(temperature, collision_rates):
+    with stage('render'):
+        plt.figure(figsize=(10, 6))
+        plt.plot(temperature, collision_rates, 'o', label='Tasa de colisiones')
+        plt.xlabel('Temperatura', fontsize=14)
+        plt.ylabel('Tasa de colisiones [collision/s]', fontsize=14)
+        plt.grid(True)
+        plt.legend()
+        plt.tight_layout()
+        plt.savefig('observables/collision_rate_over_temperature.png')
     plt.show()
 
 
@@ -183,102 +311,206 @@ def plot_temperature_over_time(df_pressure):
 
 
 
-def plot_pressure_over_temperature(df_pressure, df_particles):
+@profiled('aggregate')
+def simulation_pressure_stats(df_pressure, equilibration=0.1, blocks=256):
+    """
+    Per-simulation wall and obstacle pressure from the impulse delivered after the
+    first equilibration fraction of each run, with autocorrelation-aware errors,
+    instead of the mean/std of the cumulative running average.
+    """
+    rows = []
+    for sim, group in df_pressure.groupby('simulation'):
+        times = group['time'].values
+        wall = pressure_estimate(times, group['wallPressure'].values, equilibration, blocks)
+        obstacle = pressure_estimate(times, group['obstaclePressure'].values, equilibration, blocks)
+        rows.append({
+            'simulation': sim,
+            'wall_mean': wall['mean'], 'wall_error': wall['error'], 'wall_std': wall['std'],
+            'obstacle_mean': obstacle['mean'], 'obstacle_error': obstacle['error'], 'obstacle_std': obstacle['std'],
+        })
+    return pd.DataFrame(rows)
 
-    mass = df_particles.groupby('simulation')['mass'].mean()
+def plot_pressure_over_temperature(df_pressure, particles):
 
-    df_particles['v_squared'] = df_particles['vx']**2 + df_particles['vy']**2
-    v_squared_stats = df_particles.groupby('simulation')['v_squared'].agg(['mean', 'std']).reset_index()
-    temperature = 0.5 * mass.values * v_squared_stats['mean'] 
-
-    pressure_stats = df_pressure.groupby('simulation').agg({
-        'wallPressure': ['mean', 'std'],
-        'obstaclePressure': ['mean', 'std']
-    })
+    temperature = simulation_temperatures(particles)
 
-    pressure_stats.columns = ['wall_mean', 'wall_std', 'obstacle_mean', 'obstacle_std']
-    pressure_stats = pressure_stats.reset_index()
+    pressure_stats = simulation_pressure_stats(df_pressure)
 
     pressure_stats['system_pressure'] = pressure_stats['wall_mean'] + pressure_stats['obstacle_mean']
-    pressure_stats['pressure_error'] = np.sqrt(pressure_stats['wall_std']**2 + pressure_stats['obstacle_std']**2)
+    pressure_stats['pressure_error'] = np.sqrt(pressure_stats['wall_error']**2 + pressure_stats['obstacle_error']**2)
 
-    plt.figure(figsize=(10, 6))
+    _plot_pressure_over_temperature(temperature, pressure_stats['system_pressure'], pressure_stats['pressure_error'])
 
-    plt.errorbar(
-        temperature,
-        pressure_stats['system_pressure'],
-        yerr=pressure_stats['pressure_error'],
-        fmt='o',
-        color='blue',
-        label='Presión vs Temperatura'
-    )
 
-    ax = plt.gca()  
-    ax.yaxis.set_major_formatter(ScalarFormatter(useMathText=True))
-    ax.ticklabel_format(style='sci', axis='y', scilimits=(0,0))
+def _plot_pressure_over_temperature(temperature, system_pressure, pressure_error):
+    with stage('render'):
+        plt.figure(figsize=(10, 6))
 
-    plt.xlabel('Temperatura', fontsize=14)
-    plt.ylabel('Presión [N/m²]', fontsize=14)
-    plt.grid(True)
-    plt.tight_layout()
-    plt.savefig('observables/pressure_over_temperature.png')
-    plt.show()
+        plt.errorbar(
+            temperature,
+            system_pressure,
+            yerr=pressure_error,
+            fmt='o',
+            color='blue',
+            label='Presión vs Temperatura'
+        )
 
-def plot_pressure_over_time(df_pressure, name, use_log_scale=False):
-    total_pressure = df_pressure['wallPressure'] + df_pressure['obstaclePressure']
+        ax = plt.gca()  
+        ax.yaxis.set_major_formatter(ScalarFormatter(useMathText=True))
+        ax.ticklabel_format(style='sci', axis='y', scilimits=(0,0))
 
-    # Equilibrium value: average of the last 10% of total pressure
-    equilibrium_pressure = total_pressure.iloc[int(0.9 * len(total_pressure)):].mean()
+        plt.xlabel('Temperatura', fontsize=14)
+        plt.ylabel('Presión [N/m²]', fontsize=14)
+        plt.grid(True)
+        plt.tight_layout()
+        plt.savefig('observables/pressure_over_temperature.png')
+    plt.show()
 
-    plt.figure(figsize=(10, 6))
-    plt.plot(df_pressure['time'], df_pressure['wallPressure'], label='Presión Pared', color='blue')
-    plt.plot(df_pressure['time'], df_pressure['obstaclePressure'], label='Presión Obstaculo', color='red')
-    plt.plot(df_pressure['time'], total_pressure, label='Presión Total', color='green', linestyle='--')
 
-    # Draw equilibrium line
-    plt.axhline(equilibrium_pressure, color='gray', linestyle=':', label=f'Equilibrio ≈ {equilibrium_pressure:.0f} N/m')
+def plot_sweep_from_summaries(summaries):
+    """Both sweep plots from a SummaryStore.summaries() DataFrame, without touching the outputs"""
+    _plot_collision_rate(summaries['temperature'], summaries['collision_rate'])
+    _plot_pressure_over_temperature(
+        summaries['temperature'],
+        summaries['wall_mean'] + summaries['obstacle_mean'],
+        np.hypot(summaries['wall_error'], summaries['obstacle_error']),
+    )
 
-    plt.xlabel('Tiempo [s]', fontsize=14)
-    plt.ylabel('Presión [N/m]', fontsize=14)
-    if use_log_scale:
-        plt.yscale('log')
-    plt.legend()
-    plt.grid(True)
-    plt.tight_layout()
-    plt.savefig(f'observables/pressure_over_time_{name}.png')
-    plt.show()
+def pressure_figure_path(name):
+    return f'observables/pressure_over_time_{os.path.basename(name)}.png'
 
-def plot_pressures_over_time(df_pressure, use_log_scale=False):
-    df_by_sim = df_pressure.groupby('simulation')
+def plot_pressure_over_time(df_pressure, name, use_log_scale=False, points=None, show=True):
+    """
+    With points, every series is downsampled to about that many samples before
+    drawing (the equilibrium estimate still uses all of them). show=False closes
+    the figure once saved instead of showing it.
+    """
+    total_pressure = df_pressure['wallPressure'] + df_pressure['obstaclePressure']
+
+    # Equilibrium value: impulse delivered after the first 10% of the run, in blocks
+    with stage('aggregate', frames=len(df_pressure)):
+        times = df_pressure['time'].values
+        wall = pressure_estimate(times, df_pressure['wallPressure'].values)
+        obstacle = pressure_estimate(times, df_pressure['obstaclePressure'].values)
+        equilibrium_pressure = wall['mean'] + obstacle['mean']
+        equilibrium_error = np.hypot(wall['error'], obstacle['error'])
+
+    with stage('downsample', frames=len(df_pressure)):
+        series = [df_pressure['wallPressure'].values, df_pressure['obstaclePressure'].values, total_pressure.values]
+        if points is not None:
+            series = [downsample(times, values, points) for values in series]
+        else:
+            series = [(times, values) for values in series]
+
+    with stage('render', frames=len(df_pressure)):
+        plt.figure(figsize=(10, 6))
+        plt.plot(*series[0], label='Presión Pared', color='blue')
+        plt.plot(*series[1], label='Presión Obstaculo', color='red')
+        plt.plot(*series[2], label='Presión Total', color='green', linestyle='--')
+
+        # Draw equilibrium line
+        plt.axhline(equilibrium_pressure, color='gray', linestyle=':', label=f'Equilibrio ≈ {equilibrium_pressure:.0f} ± {equilibrium_error:.0f} N/m')
+
+        plt.xlabel('Tiempo [s]', fontsize=14)
+        plt.ylabel('Presión [N/m]', fontsize=14)
+        if use_log_scale:
+            plt.yscale('log')
+        plt.legend()
+        plt.grid(True)
+        plt.tight_layout()
+        plt.savefig(pressure_figure_path(name))
+    if show:
+        plt.show()
+    else:
+        plt.close()
+
+def _use_agg():
+    # Workers never open a window, whatever backend the parent was started with
+    matplotlib.use('Agg')
+
+def _plot_pressure_over_time_batch(group, name, points):
+    plot_pressure_over_time(group, name, True, points, show=False)
+    return pressure_figure_path(name)
+
+def plot_pressures_over_time(df_pressure, use_log_scale=False, batch=False, workers=None, points=DEFAULT_POINTS):
+    """
+    batch: headless, each simulation's figure downsampled to about points samples
+    per series and rendered in its own worker process, nothing is shown.
+    """
+    with stage('groupby', frames=len(df_pressure)):
+        df_by_sim = list(df_pressure.groupby('simulation'))
+
+    if batch:
+        with stage('render', frames=len(df_pressure)), \
+                ProcessPoolExecutor(max_workers=workers, initializer=_use_agg) as pool:
+            futures = [pool.submit(_plot_pressure_over_time_batch, group, sim, points) for sim, group in df_by_sim]
+            return [future.result() for future in futures]
 
     for sim, group in df_by_sim:
-        v_val = sim.split("-")[2][:-4]
+        v_val = sim.split("-")[2].split(".")[0]
         plot_pressure_over_time(group, sim, True)
 
 
 def main():
 
-    if len(sys.argv) == 1:
-        return print("Usage: python observables.py <directory>")
+    args = sys.argv[1:]
+    # --profile / --profile-memory: per-stage report in profile-observables.json/.csv
+    enable_from_args(args, 'observables')
+    stream = '--stream' in args
+    workers = None
+    if '--workers' in args:
+        i = args.index('--workers')
+        workers = int(args[i + 1])
+        del args[i:i + 2]
+    follow = '--follow' in args
+    # --sweep: pressure and collision rate over temperature from the summary store,
+    # only analysing the files it has not summarized yet
+    sweep = '--sweep' in args
+    # --batch: no windows, pressure figures downsampled and rendered in parallel
+    batch = '--batch' in args
+    if batch:
+        plt.switch_backend('Agg')
+    files = [arg for arg in args if arg not in ('--stream', '--follow', '--sweep', '--batch')]
+
+    if len(files) == 0:
+        return print("Usage: python observables.py [--stream | --follow | --sweep] [--batch] [--workers N] [--profile | --profile-memory] <directory>")
+
+    elif sweep:
+        # Stored summaries read nothing but the database, so no byte count
+        with SummaryStore() as store, stage('summaries'):
+            summaries = store.summaries(files, workers)
+        print(summaries[['temperature', 'wall_mean', 'obstacle_mean', 'collision_rate']])
+        return plot_sweep_from_summaries(summaries)
+
+    elif follow:
+        # Monitor a run while the simulation is still writing it
+        return monitor_simulation_file(files[0])
+
+    elif stream:
+        # Only the header scalars are kept, the particle table is never built
+        df_pressure, df_obstacle_collision = parse_multiple_simulation_files_streaming(files)
 
-    elif len(sys.argv) == 2:
-        directory = sys.argv[1]
-        df_pressure, df_obstacle_collision, df_particles = parse_simulation_file(directory)
-    
     else:
-        files = sys.argv[1:]
-        df_pressure, df_obstacle_collision, df_particles = parse_multiple_simulation_files(files)
+        # The plots below only use the header scalars, so no particle is decoded
+        df_pressure, df_obstacle_collision = parse_simulation_headers(files, workers)
 
     # print(df_pressure)
-    # print(df_particles)
+    # print(particles.to_dataframe())
     # print(df_obstacle_collision)
     # os.makedirs('observables', exist_ok=True)
+    if batch:
+        os.makedirs('observables', exist_ok=True)
+        for path in plot_pressures_over_time(df_pressure, True, batch=True, workers=workers):
+            print(f"Figura escrita en {path}")
+        return
     plot_pressures_over_time(df_pressure, True)
     # plot_individual_pressures(df_pressure, use_log_scale=True)
     # plot_temperature_over_time(df_pressure)
     # plot_collisions_over_time(df_obstacle_collision)
-    # plot_collision_rate_over_temperature(df_obstacle_collision, df_particles)
-    # plot_pressure_over_temperature(df_pressure, df_particles)
+    # The temperature plots need the particle velocities:
+    # _, _, particles = parse_multiple_simulation_files(files, workers)
+    # plot_collision_rate_over_temperature(df_obstacle_collision, particles)
+    # plot_pressure_over_temperature(df_pressure, particles)
 
 if __name__ == "__main__":
     main();
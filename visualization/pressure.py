@@ -0,0 +1,131 @@
+import numpy as np
+
+# MolecularSimulation writes wallPressure/obstaclePressure as the impulse
+# accumulated since t = 0 divided by (length * t). Multiplying back by t gives
+# the cumulative impulse per unit length J(t), and any time window [a, b] then
+# has pressure (J(b) - J(a)) / (b - a). The output keeps 4 significant digits
+# (%.3e), so J carries a ~5e-4 relative error: windows should span many
+# events for the differences to be meaningful.
+
+
+def cumulative_impulse(times, cumulative_pressure):
+    """Impulse per unit length delivered since t = 0, after every frame"""
+    return np.asarray(cumulative_pressure) * np.asarray(times)
+
+
+def impulse_increments(times, cumulative_pressure):
+    """Impulse per unit length delivered by each event"""
+    return np.diff(cumulative_impulse(times, cumulative_pressure), prepend=0.0)
+
+
+def _impulse_at(times, impulse, t):
+    # J is a step function: it only changes at events
+    index = np.searchsorted(times, t, side='right') - 1
+    return np.where(index >= 0, impulse[np.maximum(index, 0)], 0.0)
+
+
+def window_pressure(times, cumulative_pressure, window):
+    """Pressure over the trailing window of every frame, O(1) per frame from J"""
+    times = np.asarray(times)
+    impulse = cumulative_impulse(times, cumulative_pressure)
+    start = np.maximum(times - window, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (impulse - _impulse_at(times, impulse, start)) / (times - start)
+
+
+def block_pressures(times, cumulative_pressure, blocks, start_time=None):
+    """Pressure in each of blocks equal-duration blocks from start_time to the last frame"""
+    times = np.asarray(times)
+    impulse = cumulative_impulse(times, cumulative_pressure)
+    start_time = times[0] if start_time is None else start_time
+    edges = np.linspace(start_time, times[-1], blocks + 1)
+    return np.diff(_impulse_at(times, impulse, edges)) / np.diff(edges)
+
+
+def blocking_error(values, min_blocks=8):
+    """
+    Standard error of the mean of correlated samples (Flyvbjerg-Petersen): pair
+    up neighbouring samples until they decorrelate and keep the largest naive
+    standard error among levels with at least min_blocks samples.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    error = 0.0
+    while len(values) >= min_blocks:
+        error = max(error, np.std(values, ddof=1) / np.sqrt(len(values)))
+        values = 0.5 * (values[:len(values) // 2 * 2:2] + values[1:len(values) // 2 * 2:2])
+    return error
+
+
+def pressure_estimate(times, cumulative_pressure, equilibration=0.1, blocks=256):
+    """
+    Equilibrium pressure from the impulse actually delivered after discarding
+    the first equilibration fraction of the run, with a blocking error bar.
+    """
+    times = np.asarray(times)
+    start_time = times[0] + equilibration * (times[-1] - times[0])
+    values = block_pressures(times, cumulative_pressure, blocks, start_time)
+    mean = np.mean(values)
+    error = blocking_error(values)
+    return {
+        'mean': mean,
+        'error': error,
+        'relative_error': error / abs(mean) if mean else np.inf,
+        'std': np.std(values, ddof=1),
+        'block_time': (times[-1] - start_time) / blocks,
+    }
+
+
+class WindowedPressure:
+    """
+    Online block-averaged pressure for streamed frames: every block_time seconds
+    of simulation time closes a block, in O(1) amortized work per frame.
+    column is 'wall_pressure' or 'obstacle_pressure'.
+    """
+
+    def __init__(self, block_time, column='wall_pressure', equilibration_time=0.0):
+        self.block_time = block_time
+        self.column = column
+        self.equilibration_time = equilibration_time
+        self.blocks = []
+        self._next_edge = equilibration_time
+        self._last_time = 0.0
+        self._last_impulse = 0.0
+        self._edge_impulse = None
+
+    def update(self, chunk):
+        times = chunk.times
+        impulse = cumulative_impulse(times, getattr(chunk, self.column))
+        if not len(times):
+            return
+
+        last_edge = np.floor((times[-1] - self._next_edge) / self.block_time)
+        if last_edge >= 0:
+            edges = self._next_edge + self.block_time * np.arange(int(last_edge) + 1)
+            all_times = np.concatenate([[self._last_time], times])
+            all_impulse = np.concatenate([[self._last_impulse], impulse])
+            edge_impulse = _impulse_at(all_times, all_impulse, edges)
+            if self._edge_impulse is None:
+                # The first edge only opens the first block
+                self._edge_impulse, edge_impulse = edge_impulse[0], edge_impulse[1:]
+            if len(edge_impulse):
+                steps = np.diff(np.concatenate([[self._edge_impulse], edge_impulse]))
+                self.blocks.extend((steps / self.block_time).tolist())
+                self._edge_impulse = edge_impulse[-1]
+            self._next_edge += self.block_time * (int(last_edge) + 1)
+
+        self._last_time = times[-1]
+        self._last_impulse = impulse[-1]
+
+    def estimate(self):
+        values = np.asarray(self.blocks)
+        if len(values) < 2:
+            return {'mean': np.nan, 'error': np.nan, 'relative_error': np.inf, 'blocks': len(values)}
+        mean = values.mean()
+        error = blocking_error(values)
+        return {'mean': mean, 'error': error, 'relative_error': error / abs(mean) if mean else np.inf,
+                'blocks': len(values)}
+
+    def converged(self, relative_tolerance=0.01, min_blocks=32):
+        """Whether the estimate is tight enough for the run to be stopped"""
+        estimate = self.estimate()
+        return estimate['blocks'] >= min_blocks and estimate['relative_error'] <= relative_tolerance
@@ -0,0 +1,166 @@
+import atexit
+import csv
+import functools
+import json
+import os
+import time
+import tracemalloc
+
+# Stage timers for the analysis scripts. Stages nest, and each is reported
+# under its path (e.g. "parse/dataframes") with its number of calls, inclusive
+# wall time, the frames it processed, the bytes it read (bytes_read: the whole
+# files for full loads, the decoded arrays for projections that slice them),
+# and, with memory capture, the peak traced Python allocation
+# while it ran. Disabled, stage() costs one
+# attribute check, so instrumentation can stay in hot loops.
+REPORT_COLUMNS = ['stage', 'calls', 'wall_time', 'frames', 'bytes_read', 'frames_per_second', 'mb_per_second',
+                  'peak_memory_mb']
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add(self, frames=0, bytes_read=0):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name, frames, bytes_read):
+        self.profiler = profiler
+        self.name = name
+        self.frames = frames
+        self.bytes_read = bytes_read
+        self.peak = 0
+
+    def add(self, frames=0, bytes_read=0):
+        """Count frames or bytes consumed once they are known inside the stage"""
+        self.frames += frames
+        self.bytes_read += bytes_read
+
+    def __enter__(self):
+        stack = self.profiler._stack
+        if self.profiler.memory:
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.path = '/'.join(stage.name for stage in stack)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self._start
+        stack = self.profiler._stack
+        stack.pop()
+        if self.profiler.memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+        self.profiler._record(self.path, elapsed, self.frames, self.bytes_read, self.peak)
+        return False
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.stages = {}
+        self._stack = []
+
+    def enable(self, memory=False):
+        self.enabled = True
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage(self, name, frames=0, bytes_read=0):
+        """Context manager timing one pipeline stage; the stage object takes later add() counts"""
+        if not self.enabled:
+            return _NO_STAGE
+        return _Stage(self, name, frames, bytes_read)
+
+    def profiled(self, name=None):
+        """Decorator running every call of a function as a stage (named after it by default)"""
+        def decorator(function):
+            stage_name = name or function.__name__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self.stage(stage_name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _record(self, path, elapsed, frames, bytes_read, peak):
+        row = self.stages.setdefault(path, {'calls': 0, 'wall_time': 0.0, 'frames': 0, 'bytes_read': 0,
+                                            'peak_memory': 0})
+        row['calls'] += 1
+        row['wall_time'] += elapsed
+        row['frames'] += frames
+        row['bytes_read'] += bytes_read
+        row['peak_memory'] = max(row['peak_memory'], peak)
+
+    def report(self):
+        rows = []
+        for path, row in self.stages.items():
+            wall_time = row['wall_time']
+            rows.append({
+                'stage': path,
+                'calls': row['calls'],
+                'wall_time': wall_time,
+                'frames': row['frames'],
+                'bytes_read': row['bytes_read'],
+                'frames_per_second': row['frames'] / wall_time if wall_time and row['frames'] else None,
+                'mb_per_second': row['bytes_read'] / 1e6 / wall_time if wall_time and row['bytes_read'] else None,
+                'peak_memory_mb': row['peak_memory'] / 2 ** 20 if self.memory else None,
+            })
+        return rows
+
+    def write(self, basename):
+        """Write basename.json and basename.csv with one row per stage"""
+        rows = self.report()
+        with open(basename + '.json', 'w') as f:
+            json.dump({'memory': self.memory, 'stages': rows}, f, indent=2)
+        with open(basename + '.csv', 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return basename + '.json', basename + '.csv'
+
+
+def file_bytes(files):
+    """Total size of the input files, for stages that read them whole"""
+    return sum(os.path.getsize(f) for f in files)
+
+
+PROFILER = Profiler()
+stage = PROFILER.stage
+profiled = PROFILER.profiled
+
+
+def enable_from_args(args, script):
+    """
+    Handle --profile (stage timers) and --profile-memory (timers plus tracemalloc
+    peaks) in a script's argument list, removing them. The report is written to
+    profile-<script>.json/.csv when the script exits.
+    """
+    memory = '--profile-memory' in args
+    if not memory and '--profile' not in args:
+        return False
+    args[:] = [arg for arg in args if arg not in ('--profile', '--profile-memory')]
+    PROFILER.enable(memory)
+
+    def write_report():
+        json_path, _ = PROFILER.write(f'profile-{script}')
+        print(f"Perfil escrito en {json_path}")
+    atexit.register(write_report)
+    return True
@@ -0,0 +1,117 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+from cache import has_valid_cache, load_simulation_file
+from frame_index import IndexedFile, frame_range
+from reader import DELTA_SUFFIX, PARTICLE_COLUMNS
+
+# Declarative reads of simulation outputs: callers name the header scalars,
+# particle fields, particle ids and time window they use, and each backend skips
+# the rest. Delta files only rebuild the requested particles, cached files slice
+# their memory map, and text files go through the frame index, decoding only the
+# requested frames and, per frame, the lines up to the last requested particle.
+SCALARS = ('wall_pressure', 'obstacle_pressure', 'first_time_collisions', 'total_collisions')
+
+
+class Projection(NamedTuple):
+    times: np.ndarray
+    scalars: dict        # requested SCALARS name -> frames array
+    particles: np.ndarray  # frames x len(ids) x len(fields)
+    ids: np.ndarray
+    fields: tuple
+
+    @property
+    def frames(self):
+        return len(self.times)
+
+    @property
+    def nbytes(self):
+        """Size of the decoded arrays, i.e. what was sliced out of the file"""
+        return self.times.nbytes + sum(value.nbytes for value in self.scalars.values()) + self.particles.nbytes
+
+    def field(self, name):
+        """frames x len(ids) values of one particle field"""
+        return self.particles[:, :, self.fields.index(name)]
+
+    def __getattr__(self, name):
+        # Requested scalars read like SimulationData attributes
+        if name in SCALARS and name in self.scalars:
+            return self.scalars[name]
+        raise AttributeError(name)
+
+
+def _window(times, frames, t_min, t_max):
+    if frames is not None:
+        start, stop, _ = frames.indices(len(times))
+        return start, max(stop, start)
+    return frame_range(times, t_min, t_max)
+
+
+def _read(filename, frames, t_min, t_max, step, ids):
+    """SimulationData of the window, and the ids still to pick from its particles (None when done)"""
+    if filename.endswith(DELTA_SUFFIX):
+        from delta import DeltaTrajectory
+        trajectory = DeltaTrajectory(filename)
+        start, stop = _window(trajectory.header[:, 0], frames, t_min, t_max)
+        data, _ = trajectory.chunk(start, stop, particles=ids)
+        return data._replace(**{name: value[::step] for name, value in data._asdict().items()}), None
+
+    if has_valid_cache(filename):
+        data = load_simulation_file(filename)
+        selection = slice(*_window(data.times, frames, t_min, t_max), step)
+        selected = {name: value[selection] for name, value in data._asdict().items() if name != 'particles'}
+        particles = data.particles[selection] if ids is None else data.particles[selection, ids]
+        return data._replace(particles=particles, **selected), None
+
+    with IndexedFile(filename) as indexed:
+        start, stop = _window(indexed.times, frames, t_min, t_max)
+        prefix = None if ids is None else (int(np.max(ids)) + 1 if len(ids) else 0)
+        # The text prefix holds particles 0..max(ids)
+        return indexed.read(start, stop, step, prefix), ids
+
+
+def query(filename, scalars=(), fields=(), particles=None, t_min=None, t_max=None, step=1, frames=None):
+    """
+    Read only what is asked for from a simulation output (text, cached or delta).
+
+    scalars: names from SCALARS; fields: names from PARTICLE_COLUMNS (x, y, vx,
+    vy, radius, mass); particles: particle ids, None for all of them; t_min and
+    t_max: the frames in effect during that window, or frames: a slice of frame
+    indices; every step-th of those frames. Without fields no particle is
+    decoded at all.
+    """
+    for name in scalars:
+        if name not in SCALARS:
+            raise ValueError(f"Unknown header scalar {name!r}, expected one of {SCALARS}.")
+    for name in fields:
+        if name not in PARTICLE_COLUMNS:
+            raise ValueError(f"Unknown particle field {name!r}, expected one of {PARTICLE_COLUMNS}.")
+    fields = tuple(fields)
+    ids = np.arange(0) if not fields else (None if particles is None else np.atleast_1d(particles))
+
+    data, selection = _read(filename, frames, t_min, t_max, step, ids)
+    columns = [PARTICLE_COLUMNS.index(name) for name in fields]
+    values = data.particles if selection is None else data.particles[:, selection]
+    return Projection(
+        times=np.asarray(data.times),
+        scalars={name: np.asarray(getattr(data, name)) for name in scalars},
+        particles=np.asarray(values[:, :, columns]),
+        ids=np.arange(values.shape[1]) if ids is None else ids,
+        fields=fields,
+    )
+
+
+def _query(arguments):
+    filename, kwargs = arguments
+    return query(filename, **kwargs)
+
+
+def query_files(files, workers=None, **kwargs):
+    """query on several files, concurrently across a process pool; only the projections travel back"""
+    files = list(files)
+    if workers == 1 or len(files) <= 1:
+        return [query(f, **kwargs) for f in files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_query, [(f, kwargs) for f in files]))
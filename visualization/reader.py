@@ -0,0 +1,184 @@
+import os
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+# Layout written by MolecularSimulation.writeOutput: the particle count on the
+# first line, then for every event a block of HEADER_LINES scalar lines
+# followed by one line per particle with PARTICLE_COLUMNS.
+HEADER_LINES = 5
+HEADER_COLUMNS = ['time', 'wallPressure', 'obstaclePressure', 'firstTimeCollisions', 'totalCollisions']
+PARTICLE_COLUMNS = ['x', 'y', 'vx', 'vy', 'radius', 'mass']
+X, Y, VX, VY, RADIUS, MASS = range(len(PARTICLE_COLUMNS))
+
+# Compact binary trajectories, see delta.py
+DELTA_SUFFIX = '.delta.npz'
+
+
+class SimulationData(NamedTuple):
+    times: np.ndarray
+    wall_pressure: np.ndarray
+    obstacle_pressure: np.ndarray
+    first_time_collisions: np.ndarray
+    total_collisions: np.ndarray
+    particles: np.ndarray  # frames x N x 6, columns as in PARTICLE_COLUMNS
+
+    @property
+    def n(self):
+        return self.particles.shape[1]
+
+    @property
+    def frames(self):
+        return self.particles.shape[0]
+
+
+def frame_size(n):
+    """Number of values in one event block for n particles"""
+    return HEADER_LINES + len(PARTICLE_COLUMNS) * n
+
+
+def from_block(n, block):
+    """Build a SimulationData from a frames x frame_size(n) block"""
+    return SimulationData(
+        times=block[:, 0],
+        wall_pressure=block[:, 1],
+        obstacle_pressure=block[:, 2],
+        first_time_collisions=block[:, 3].astype(np.int64),
+        total_collisions=block[:, 4].astype(np.int64),
+        particles=block[:, HEADER_LINES:].reshape(block.shape[0], n, len(PARTICLE_COLUMNS)),
+    )
+
+
+def from_values(values):
+    """Build a SimulationData from the flat token array of an output file"""
+    if values.size == 0:
+        raise ValueError("Empty simulation file.")
+    n = int(values[0])
+    size = frame_size(n)
+    # A trailing, partially written frame is dropped
+    frames = (values.size - 1) // size
+    return from_block(n, values[1:1 + frames * size].reshape(frames, size))
+
+
+def read_simulation_file(filename):
+    """Load an output-N-V.txt file into NumPy arrays in a single vectorized pass"""
+    if filename.endswith(DELTA_SUFFIX):
+        from delta import DeltaTrajectory
+        return DeltaTrajectory(filename).data()
+    with open(filename, "r") as f:
+        values = np.fromstring(f.read(), dtype=np.float64, sep=' ')
+    return from_values(values)
+
+
+def _chunk_size_bytes(n, chunk_frames):
+    # Rough upper bound of the text size of chunk_frames frames, see Particle.toString
+    return chunk_frames * (HEADER_LINES * 12 + n * 64)
+
+
+def _split_frames(n, values, chunk_frames):
+    """Complete frames of values as SimulationData chunks, plus the trailing values of a partial frame"""
+    size = frame_size(n)
+    frames = values.size // size
+    block = values[:frames * size].reshape(frames, size)
+    chunks = [from_block(n, block[start:start + chunk_frames]) for start in range(0, frames, chunk_frames)]
+    return chunks, values[frames * size:].copy()
+
+
+def iter_frame_chunks(filename, chunk_frames=1024):
+    """
+    Yield the file as consecutive SimulationData chunks of at most chunk_frames frames.
+    Only one chunk of text and values is held in memory at a time.
+    """
+    if filename.endswith(DELTA_SUFFIX):
+        from delta import DeltaTrajectory
+        yield from DeltaTrajectory(filename).iter_chunks(chunk_frames)
+        return
+    with open(filename, "r") as f:
+        first = f.readline()
+        if not first.strip():
+            return
+        n = int(first)
+        chunk_bytes = _chunk_size_bytes(n, chunk_frames)
+        leftover = np.empty(0)
+
+        while True:
+            text = f.read(chunk_bytes)
+            if not text:
+                break
+            # Never split a number across two chunks
+            text += f.readline()
+            values = np.fromstring(text, dtype=np.float64, sep=' ')
+            if leftover.size:
+                values = np.concatenate([leftover, values])
+            chunks, leftover = _split_frames(n, values, chunk_frames)
+            yield from chunks
+
+
+def _new_run(f, filename):
+    """Whether filename no longer is the file open as f, or was truncated below what was read"""
+    try:
+        current = os.stat(filename)
+    except FileNotFoundError:
+        return True
+    opened = os.fstat(f.fileno())
+    if (current.st_ino, current.st_dev) != (opened.st_ino, opened.st_dev):
+        return True
+    return current.st_size < f.tell()
+
+
+def follow_frames(filename, chunk_frames=1024, poll_interval=0.5, idle_timeout=None):
+    """
+    Like iter_frame_chunks, but keep following the file while the simulation
+    appends to it (tail -f). A partially written trailing line or frame is held
+    back until it is complete, and each poll only decodes the newly appended
+    bytes. Stops once the file has not grown for idle_timeout seconds (never
+    when None), or when a new run starts: the simulation deletes the output and
+    writes a new file (the path is missing or names another inode), or it
+    truncates the file in place.
+    """
+    idle = 0.0
+    f = None
+    try:
+        while f is None:
+            try:
+                f = open(filename, "rb")
+            except FileNotFoundError:
+                if idle_timeout is not None and idle >= idle_timeout:
+                    return
+                time.sleep(poll_interval)
+                idle += poll_interval
+
+        n = None
+        pending = b''
+        leftover = np.empty(0)
+        while True:
+            data = f.read(_chunk_size_bytes(n or 1, chunk_frames))
+            if not data:
+                if _new_run(f, filename):
+                    return
+                if idle_timeout is not None and idle >= idle_timeout:
+                    return
+                time.sleep(poll_interval)
+                idle += poll_interval
+                continue
+
+            idle = 0.0
+            data = pending + data
+            # Only decode complete lines, the writer may be in the middle of one
+            cut = data.rfind(b'\n') + 1
+            data, pending = data[:cut], data[cut:]
+            if n is None:
+                if not data:
+                    continue
+                first, data = data.split(b'\n', 1)
+                n = int(first)
+
+            values = np.fromstring(data.decode(), dtype=np.float64, sep=' ')
+            if leftover.size:
+                values = np.concatenate([leftover, values])
+            chunks, leftover = _split_frames(n, values, chunk_frames)
+            yield from chunks
+    finally:
+        if f is not None:
+            f.close()
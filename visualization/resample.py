@@ -0,0 +1,49 @@
+import numpy as np
+
+# Every frame is written right after an event, so between two frames each
+# particle flies in a straight line with the velocity of the earlier frame.
+# Positions are interpolated along that segment, like np.interp: the headers
+# only keep 4 significant digits of time (%.3e), so advancing v * (t - t_i)
+# from a rounded t_i drifts off the segment, while the written end positions
+# bound the interpolation. Query times outside the run are clamped to its
+# first or last frame.
+
+
+def uniform_times(times, dt=None, num=None, start=None, end=None):
+    """Evenly spaced query times over [start, end], by step dt or by count num"""
+    start = times[0] if start is None else start
+    end = times[-1] if end is None else end
+    if dt is not None:
+        return start + dt * np.arange(int(np.floor((end - start) / dt + 1e-9)) + 1)
+    return np.linspace(start, end, num)
+
+
+def frame_indices(times, query_times):
+    """Index of the last frame at or before each query time (the first frame for earlier queries)"""
+    indices = np.searchsorted(times, query_times, side='right') - 1
+    return np.clip(indices, 0, len(times) - 1)
+
+
+def resample_states(times, states, query_times):
+    """
+    State of every particle at each query time.
+    states is frames x ... x 4 with (x, y, vx, vy) last, e.g. frames x N x 4 for
+    all particles or frames x 4 for a single one; the result is queries x ... x 4,
+    with the velocities of the last frame at or before each time.
+    """
+    times = np.asarray(times)
+    query_times = np.asarray(query_times, dtype=np.float64)
+    indices = frame_indices(times, query_times)
+    following = np.minimum(indices + 1, len(times) - 1)
+    t0, t1 = times[indices], times[following]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(t1 > t0, (query_times - t0) / (t1 - t0), 0.0)
+    weight = np.clip(weight, 0.0, 1.0).reshape((-1,) + (1,) * (np.ndim(states) - 1))
+
+    result = np.asarray(states[indices], dtype=np.float64)
+    result[..., 0:2] += weight * (np.asarray(states[following][..., 0:2], dtype=np.float64) - result[..., 0:2])
+    return result
+
+
+def resample_positions(times, states, query_times):
+    return resample_states(times, states, query_times)[..., 0:2]
@@ -0,0 +1,214 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import NamedTuple
+
+import numpy as np
+
+from cache import load_simulation_file
+from reader import PARTICLE_COLUMNS, VX, VY, SimulationData
+
+# A parsed run in one multiprocessing.shared_memory block, so that several
+# analyses can work on it in parallel worker processes with a single copy of
+# the data in memory. Layout, all 8-byte items:
+#   times, wall_pressure, obstacle_pressure   float64, frames each
+#   first_time_collisions, total_collisions   int64, frames each
+#   particles                                 float64, frames x N x 6
+# Workers receive a SharedHandle (the block's name and shape), attach to the
+# block and get a SimulationData of NumPy views into it: nothing is copied or
+# pickled but the handle and the results. Attach only from processes started by
+# the owner (e.g. through run_shared), which share its resource tracker.
+FLOAT_HEADERS = ['times', 'wall_pressure', 'obstacle_pressure']
+INT_HEADERS = ['first_time_collisions', 'total_collisions']
+
+
+class SharedHandle(NamedTuple):
+    name: str
+    frames: int
+    n: int
+    label: str = None
+
+
+def _nbytes(frames, n):
+    return 8 * frames * (len(FLOAT_HEADERS) + len(INT_HEADERS) + n * len(PARTICLE_COLUMNS))
+
+
+def _views(buffer, frames, n):
+    arrays = {}
+    offset = 0
+    for name in FLOAT_HEADERS + INT_HEADERS:
+        dtype = np.float64 if name in FLOAT_HEADERS else np.int64
+        arrays[name] = np.ndarray((frames,), dtype=dtype, buffer=buffer, offset=offset)
+        offset += 8 * frames
+    arrays['particles'] = np.ndarray((frames, n, len(PARTICLE_COLUMNS)), dtype=np.float64, buffer=buffer,
+                                     offset=offset)
+    return SimulationData(**arrays)
+
+
+class SharedSimulation:
+    """
+    One run in shared memory. The process that creates it owns the block and
+    unlinks it on close() (or when leaving the with block); attached processes
+    only unmap it.
+    """
+
+    def __init__(self, memory, handle, owner):
+        self.memory = memory
+        self.handle = handle
+        self.owner = owner
+        self.data = _views(memory.buf, handle.frames, handle.n)
+
+    @classmethod
+    def create(cls, data, label=None):
+        memory = shared_memory.SharedMemory(create=True, size=max(_nbytes(data.frames, data.n), 1))
+        shared = cls(memory, SharedHandle(memory.name, data.frames, data.n, label), owner=True)
+        for name, target in zip(SimulationData._fields, shared.data):
+            target[...] = getattr(data, name)
+        return shared
+
+    @classmethod
+    def from_file(cls, filename):
+        # The sidecar cache is memory-mapped, so this is the only full copy made
+        return cls.create(load_simulation_file(filename), label=filename)
+
+    @classmethod
+    def attach(cls, handle):
+        return cls(shared_memory.SharedMemory(name=handle.name), handle, owner=False)
+
+    @property
+    def nbytes(self):
+        return _nbytes(self.handle.frames, self.handle.n)
+
+    def close(self):
+        # Views must go before the buffer they point into can be released
+        self.data = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def share_files(files):
+    """A SharedSimulation for every file, all closed again if any one fails"""
+    shared = []
+    try:
+        for f in files:
+            shared.append(SharedSimulation.from_file(f))
+    except BaseException:
+        for s in shared:
+            s.close()
+        raise
+    return shared
+
+
+# Worker-side attachments by block name, kept for the life of the worker so
+# that results may still reference the views while they are pickled
+_attached = {}
+
+
+def _data(dataset):
+    if isinstance(dataset, (list, tuple)) and not isinstance(dataset, SharedHandle):
+        return [_data(d) for d in dataset]
+    if dataset.name not in _attached:
+        _attached[dataset.name] = SharedSimulation.attach(dataset)
+    return _attached[dataset.name].data
+
+
+def _handles(dataset):
+    if isinstance(dataset, SharedSimulation):
+        return dataset.handle
+    if isinstance(dataset, (list, tuple)):
+        return [_handles(d) for d in dataset]
+    return dataset
+
+
+def _run_attached(function, handles, args):
+    return function(_data(handles), *args)
+
+
+def run_shared(tasks, workers=None):
+    """
+    Run (function, dataset, *args) tasks in parallel worker processes, each as
+    function(data, *args) where data is the SimulationData of the dataset (a
+    SharedSimulation, or a list of them for a list of SimulationData). Results
+    come back in task order.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_attached, function, _handles(dataset), args) for function, dataset, *args in tasks]
+        return [future.result() for future in futures]
+
+
+# Analyses over views of a shared run
+
+def pressure_stats(data, equilibration=0.1, blocks=256):
+    from pressure import pressure_estimate
+    return {
+        'wall': pressure_estimate(data.times, data.wall_pressure, equilibration, blocks),
+        'obstacle': pressure_estimate(data.times, data.obstacle_pressure, equilibration, blocks),
+    }
+
+
+def temperature(data):
+    from table import ParticleTable
+    return ParticleTable.from_simulation_data(data).temperature()
+
+
+def speed_histogram(data, bins=100, chunk_frames=1024):
+    """Histogram of every particle's speed over all frames, chunk by chunk to bound temporaries"""
+    velocities = data.particles[:, :, VX:VY + 1]
+    top = np.hypot(velocities[..., 0], velocities[..., 1]).max() if data.frames else 1.0
+    edges = np.linspace(0.0, top, bins + 1)
+    counts = np.zeros(bins, dtype=np.int64)
+    for start in range(0, data.frames, chunk_frames):
+        chunk = velocities[start:start + chunk_frames]
+        counts += np.histogram(np.hypot(chunk[..., 0], chunk[..., 1]), bins=edges)[0]
+    return edges, counts
+
+
+def collision_summary(data):
+    from collisions import events_from_data, free_flights, mean_free_path
+    return mean_free_path(free_flights(events_from_data(data)))
+
+
+def dcm(datas):
+    from dcm import big_particle_states, compute_dcm
+    states = [big_particle_states(data) for data in datas]
+    return compute_dcm([t for t, _ in states], [p for _, p in states])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python shared.py [--workers N] <simulation_file1> <simulation_file2> ...")
+        sys.exit(1)
+
+    filenames = sys.argv[1:]
+    workers = None
+    if '--workers' in filenames:
+        i = filenames.index('--workers')
+        workers = int(filenames[i + 1])
+        del filenames[i:i + 2]
+
+    shared = share_files(filenames)
+    try:
+        print(f"Memoria compartida: {sum(s.nbytes for s in shared) / 2 ** 20:.1f} MB")
+        tasks = []
+        for s in shared:
+            tasks += [(pressure_stats, s), (temperature, s), (collision_summary, s), (speed_histogram, s)]
+        tasks.append((dcm, shared))
+        results = run_shared(tasks, workers)
+
+        for i, s in enumerate(shared):
+            stats, temp, flights, _ = results[4 * i:4 * i + 4]
+            print(f"{s.handle.label}: presión pared {stats['wall']['mean']:.3e} ± {stats['wall']['error']:.1e} N/m, "
+                  f"obstáculo {stats['obstacle']['mean']:.3e} ± {stats['obstacle']['error']:.1e} N/m, "
+                  f"temperatura {temp:.3e}, camino libre medio {flights['mean_free_path']:.3e} m")
+        print(results[-1])
+    finally:
+        for s in shared:
+            s.close()
@@ -0,0 +1,406 @@
+import math
+import sys
+
+import numpy as np
+
+from reader import frame_size, from_block
+
+# Same model as the Java MolecularSimulation: a circular container, an optional
+# fixed obstacle in the centre (or, without it, a free big particle of the
+# obstacle's size as particle 0), elastic wall, obstacle and particle-particle
+# collisions, and the same output-N-V.txt format.
+#
+# Unlike the Java version, particles are never advanced globally: each keeps its
+# own clock and is only moved when it takes part in an event. Pair collisions
+# are only predicted against particles in the neighbouring cells of a grid, with
+# cell crossings as extra (unwritten) events, and every particle keeps just its
+# earliest event in an indexed priority queue.
+CONTAINER_DIAMETER = 0.1
+OBSTACLE_RADIUS = 0.005
+BIG_PARTICLE_MASS = 3
+PARTICLE_MASS = 1
+# Roots closer than this are the collision that was just handled
+TIME_THRESHOLD = 1e-10
+
+NONE, WALL, OBSTACLE, PARTICLE_PARTICLE, CELL = range(5)
+
+
+class IndexedMinHeap:
+    """Binary heap holding one key per item (particle), with O(log n) key updates"""
+
+    def __init__(self, size):
+        self.keys = np.full(size, np.inf)
+        self._heap = list(range(size))
+        self._position = list(range(size))
+
+    def _swap(self, a, b):
+        heap = self._heap
+        heap[a], heap[b] = heap[b], heap[a]
+        self._position[heap[a]] = a
+        self._position[heap[b]] = b
+
+    def _sift_up(self, index):
+        keys, heap = self.keys, self._heap
+        while index > 0:
+            parent = (index - 1) // 2
+            if keys[heap[index]] >= keys[heap[parent]]:
+                break
+            self._swap(index, parent)
+            index = parent
+
+    def _sift_down(self, index):
+        keys, heap = self.keys, self._heap
+        size = len(heap)
+        while True:
+            smallest, left, right = index, 2 * index + 1, 2 * index + 2
+            if left < size and keys[heap[left]] < keys[heap[smallest]]:
+                smallest = left
+            if right < size and keys[heap[right]] < keys[heap[smallest]]:
+                smallest = right
+            if smallest == index:
+                break
+            self._swap(index, smallest)
+            index = smallest
+
+    def update(self, item, key):
+        old = self.keys[item]
+        self.keys[item] = key
+        if key < old:
+            self._sift_up(self._position[item])
+        else:
+            self._sift_down(self._position[item])
+
+    def top(self):
+        return self._heap[0]
+
+
+class TextWriter:
+    """Writes frames in MolecularSimulation.writeOutput's format"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+
+    def write(self, time, wall_pressure, obstacle_pressure, first_time_collisions, total_collisions, particles):
+        if self._file is None:
+            self._file = open(self.filename, 'w')
+            self._file.write(f"{len(particles)}\n")
+        self._file.write(f"{time:.3e}\n{wall_pressure:.3e}\n{obstacle_pressure:.3e}\n"
+                         f"{first_time_collisions}\n{total_collisions}\n")
+        # Particle.toString
+        self._file.write(("%f %f %f %f %.4f %.6f\n" * len(particles)) % tuple(particles.ravel()))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class ArrayCollector:
+    """Keeps frames in memory and hands them back as SimulationData, without touching disk"""
+
+    def __init__(self):
+        self._rows = []
+        self.n = None
+
+    def write(self, time, wall_pressure, obstacle_pressure, first_time_collisions, total_collisions, particles):
+        self.n = len(particles)
+        self._rows.append(np.concatenate([
+            [time, wall_pressure, obstacle_pressure, first_time_collisions, total_collisions],
+            particles.ravel(),
+        ]))
+
+    def close(self):
+        pass
+
+    def data(self):
+        if not self._rows:
+            return from_block(self.n or 0, np.empty((0, frame_size(self.n or 0))))
+        return from_block(self.n, np.stack(self._rows))
+
+
+class MolecularSimulation:
+
+    def __init__(self, particles_amount, particles_speed, particles_radius, max_simulation_time,
+                 obstacle_present, seed=None, cell_size=None):
+        self.particles_amount = particles_amount
+        self.particles_speed = particles_speed
+        self.particles_radius = particles_radius
+        self.max_simulation_time = max_simulation_time
+        self.obstacle_present = obstacle_present
+        self.rng = np.random.default_rng(seed)
+
+        self.current_time = 0.0
+        self.total_wall_impulse = 0.0
+        self.total_obstacle_impulse = 0.0
+        self.total_obstacle_collisions = 0
+        self.collided_with_obstacle = set()
+
+        self._initialize_particles()
+        self._initialize_grid(cell_size)
+
+        n = self.particles_amount
+        self.heap = IndexedMinHeap(n)
+        self.event_kind = np.full(n, NONE)
+        self.event_partner = np.full(n, -1)
+        self.event_partner_count = np.zeros(n, dtype=np.int64)
+        self.event_axis = np.zeros(n, dtype=np.int64)
+        self.event_step = np.zeros(n, dtype=np.int64)
+
+    def _initialize_particles(self):
+        """Container.initializeParticles: random non-overlapping positions and directions"""
+        n = self.particles_amount
+        self.position = np.zeros((n, 2))
+        self.velocity = np.zeros((n, 2))
+        self.clock = np.zeros(n)
+        self.radius = np.full(n, float(self.particles_radius))
+        self.mass = np.full(n, float(PARTICLE_MASS))
+        self.count = np.zeros(n, dtype=np.int64)
+
+        first = 0
+        if not self.obstacle_present:
+            # The obstacle is a free big particle, resting at the centre
+            self.radius[0] = OBSTACLE_RADIUS
+            self.mass[0] = BIG_PARTICLE_MASS
+            first = 1
+
+        min_r = OBSTACLE_RADIUS + self.particles_radius
+        max_r = CONTAINER_DIAMETER / 2 - self.particles_radius
+        for i in range(first, n):
+            for _ in range(10000):
+                r = self.rng.uniform(min_r, max_r)
+                theta = self.rng.uniform(0, 2 * math.pi)
+                candidate = np.array([r * math.cos(theta), r * math.sin(theta)])
+                distance = np.hypot(*(self.position[:i] - candidate).T)
+                if np.all(distance >= self.radius[:i] + self.radius[i]):
+                    break
+            else:
+                raise RuntimeError("Max attempts")
+            angle = self.rng.uniform(0, 2 * math.pi)
+            self.position[i] = candidate
+            self.velocity[i] = self.particles_speed * math.cos(angle), self.particles_speed * math.sin(angle)
+
+    def _initialize_grid(self, cell_size):
+        n = self.particles_amount
+        # Particles too big for the grid (the big particle) are checked against everyone
+        small = self.radius <= self.particles_radius
+        contact = 2 * self.radius[small].max() if small.any() else CONTAINER_DIAMETER
+        if cell_size is None:
+            # About two particles per cell, never smaller than a contact distance
+            cell_size = CONTAINER_DIAMETER / max(1, int(math.sqrt(n / 2)))
+        self.cell_size = max(cell_size, contact)
+        self.cells_per_side = max(1, int(math.ceil(CONTAINER_DIAMETER / self.cell_size)))
+        self.origin = -CONTAINER_DIAMETER / 2
+
+        self.is_global = self.radius * 2 > self.cell_size
+        self.global_particles = np.flatnonzero(self.is_global)
+        self.cell = np.zeros((n, 2), dtype=np.int64)
+        self.cells = [set() for _ in range(self.cells_per_side ** 2)]
+        for i in np.flatnonzero(~self.is_global):
+            self.cell[i] = self._cell_of(self.position[i])
+            self.cells[self._cell_index(self.cell[i])].add(i)
+
+    def _cell_of(self, position):
+        cell = np.floor((position - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(cell, 0, self.cells_per_side - 1)
+
+    def _cell_index(self, cell):
+        return int(cell[0]) * self.cells_per_side + int(cell[1])
+
+    def _neighbours(self, i):
+        if self.is_global[i]:
+            others = np.arange(self.particles_amount)
+        else:
+            cx, cy = self.cell[i]
+            members = list(self.global_particles)
+            for x in range(max(cx - 1, 0), min(cx + 2, self.cells_per_side)):
+                for y in range(max(cy - 1, 0), min(cy + 2, self.cells_per_side)):
+                    members.extend(self.cells[x * self.cells_per_side + y])
+            others = np.array(members, dtype=np.int64)
+        return others[others != i]
+
+    def _advance(self, i):
+        """Bring particle i's lazy clock up to the current time"""
+        self.position[i] += self.velocity[i] * (self.current_time - self.clock[i])
+        self.clock[i] = self.current_time
+
+    def _positions_now(self, indices=slice(None)):
+        return self.position[indices] + self.velocity[indices] * (self.current_time - self.clock[indices])[:, None]
+
+    def _boundary_time(self, i, boundary_radius):
+        """Earliest root past TIME_THRESHOLD of |x + v t| = boundary_radius, as solveQuadraticToFindCollisionTime"""
+        (x, y), (vx, vy) = self.position[i], self.velocity[i]
+        a = vx * vx + vy * vy
+        b = 2 * (x * vx + y * vy)
+        c = x * x + y * y - boundary_radius * boundary_radius
+        delta = b * b - 4 * a * c
+        if a == 0 or delta < 0:
+            return math.inf
+        root = math.sqrt(delta)
+        times = [t for t in ((-b - root) / (2 * a), (-b + root) / (2 * a)) if t > TIME_THRESHOLD]
+        return min(times) if times else math.inf
+
+    def _predict(self, i):
+        """Schedule particle i's earliest event from the current time"""
+        self._advance(i)
+        best_time, kind, partner, axis, step = math.inf, NONE, -1, 0, 0
+
+        wall_time = self._boundary_time(i, CONTAINER_DIAMETER / 2 - self.radius[i])
+        if wall_time < best_time:
+            best_time, kind = wall_time, WALL
+
+        if self.obstacle_present:
+            obstacle_time = self._boundary_time(i, OBSTACLE_RADIUS + self.radius[i])
+            if obstacle_time < best_time:
+                best_time, kind = obstacle_time, OBSTACLE
+
+        others = self._neighbours(i)
+        if len(others):
+            dr = self._positions_now(others) - self.position[i]
+            dv = self.velocity[others] - self.velocity[i]
+            dvdr = np.einsum('ij,ij->i', dr, dv)
+            dvdv = np.einsum('ij,ij->i', dv, dv)
+            sigma = self.radius[others] + self.radius[i]
+            d = dvdr * dvdr - dvdv * (np.einsum('ij,ij->i', dr, dr) - sigma * sigma)
+            approaching = (dvdr < 0) & (d >= 0)
+            if approaching.any():
+                with np.errstate(invalid='ignore'):
+                    dt = -(dvdr + np.sqrt(d)) / dvdv
+                dt = np.where(approaching & (dt >= 0), dt, np.inf)
+                nearest = int(np.argmin(dt))
+                if dt[nearest] < best_time:
+                    best_time, kind, partner = dt[nearest], PARTICLE_PARTICLE, int(others[nearest])
+
+        if not self.is_global[i]:
+            for a in range(2):
+                v = self.velocity[i, a]
+                if v == 0:
+                    continue
+                edge = self.origin + self.cell_size * (self.cell[i, a] + (1 if v > 0 else 0))
+                crossing = max((edge - self.position[i, a]) / v, 0.0)
+                if crossing < best_time:
+                    best_time, kind, partner, axis, step = crossing, CELL, -1, a, (1 if v > 0 else -1)
+
+        self.event_kind[i] = kind
+        self.event_partner[i] = partner
+        self.event_partner_count[i] = self.count[partner] if partner >= 0 else 0
+        self.event_axis[i] = axis
+        self.event_step[i] = step
+        self.heap.update(i, self.current_time + best_time)
+
+    def _reflect(self, i):
+        """Specular reflection on a circle centred at the origin; returns the impulse magnitude"""
+        normal = self.position[i] / np.linalg.norm(self.position[i])
+        dot = self.velocity[i] @ normal
+        self.velocity[i] -= 2 * dot * normal
+        self.count[i] += 1
+        return 2 * self.mass[i] * abs(dot)
+
+    def _handle_wall_collision(self, i):
+        self.total_wall_impulse += self._reflect(i)
+
+    def _handle_obstacle_collision(self, i):
+        self.total_obstacle_impulse += self._reflect(i)
+        self.total_obstacle_collisions += 1
+        self.collided_with_obstacle.add(i)
+
+    def _handle_particle_collision(self, i, j):
+        dr = self.position[j] - self.position[i]
+        dv = self.velocity[j] - self.velocity[i]
+        sigma = np.linalg.norm(dr)
+        impulse = 2 * self.mass[i] * self.mass[j] * (dr @ dv) / (sigma * (self.mass[i] + self.mass[j]))
+        jx, jy = impulse * dr / sigma
+        self.velocity[i] += (jx / self.mass[i], jy / self.mass[i])
+        self.velocity[j] -= (jx / self.mass[j], jy / self.mass[j])
+        self.count[i] += 1
+        self.count[j] += 1
+
+    def _move_cell(self, i):
+        old = self._cell_index(self.cell[i])
+        self.cell[i, self.event_axis[i]] = np.clip(self.cell[i, self.event_axis[i]] + self.event_step[i],
+                                                   0, self.cells_per_side - 1)
+        self.cells[old].discard(i)
+        self.cells[self._cell_index(self.cell[i])].add(i)
+
+    def pressures(self):
+        """calculateAndPrintPressures"""
+        wall_length = math.pi * CONTAINER_DIAMETER
+        obstacle_length = 2 * math.pi * OBSTACLE_RADIUS
+        wall = self.total_wall_impulse / (wall_length * self.current_time)
+        obstacle = self.total_obstacle_impulse / (obstacle_length * self.current_time) if self.obstacle_present else 0
+        return wall, obstacle
+
+    def frame(self):
+        """Current particles as an N x 6 block in PARTICLE_COLUMNS order"""
+        return np.column_stack([self._positions_now(), self.velocity, self.radius, self.mass])
+
+    def run(self, sink):
+        """Process events until max_simulation_time, writing a frame to sink after each collision"""
+        for i in range(self.particles_amount):
+            self._predict(i)
+
+        try:
+            while self.current_time < self.max_simulation_time:
+                i = self.heap.top()
+                event_time = self.heap.keys[i]
+                if math.isinf(event_time):
+                    break
+                kind, j = self.event_kind[i], self.event_partner[i]
+
+                if kind == PARTICLE_PARTICLE and self.count[j] != self.event_partner_count[i]:
+                    # The partner changed course since this was predicted
+                    self._predict(i)
+                    continue
+
+                self.current_time = event_time
+                self._advance(i)
+                if kind == CELL:
+                    self._move_cell(i)
+                    self._predict(i)
+                    continue
+                if kind == WALL:
+                    self._handle_wall_collision(i)
+                elif kind == OBSTACLE:
+                    self._handle_obstacle_collision(i)
+                else:
+                    self._advance(j)
+                    self._handle_particle_collision(i, j)
+
+                wall_pressure, obstacle_pressure = self.pressures()
+                sink.write(self.current_time, wall_pressure, obstacle_pressure,
+                           len(self.collided_with_obstacle), self.total_obstacle_collisions, self.frame())
+                self._predict(i)
+                if kind == PARTICLE_PARTICLE:
+                    self._predict(j)
+        finally:
+            sink.close()
+        return sink
+
+
+def output_filename(particles_amount, particles_speed):
+    return f"output-{particles_amount}-{particles_speed:.0f}.txt"
+
+
+def run_simulation(particles_amount, particles_speed, particles_radius, max_simulation_time, obstacle_present,
+                   output=None, seed=None):
+    """
+    Run a simulation and write it to output (output-N-V.txt by default). With
+    output=False nothing is written and the frames come back as SimulationData.
+    """
+    simulation = MolecularSimulation(particles_amount, particles_speed, particles_radius,
+                                     max_simulation_time, obstacle_present, seed)
+    if output is False:
+        return simulation.run(ArrayCollector()).data()
+    filename = output or output_filename(particles_amount, particles_speed)
+    simulation.run(TextWriter(filename))
+    return filename
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 6:
+        print("Usage: python simulation.py <particlesAmount> <particlesSpeed> <particlesRadius> "
+              "<maxSimulationTime> <obstaclePresent> [seed]")
+        sys.exit(1)
+    amount, speed, radius, max_time = int(sys.argv[1]), float(sys.argv[2]), float(sys.argv[3]), float(sys.argv[4])
+    obstacle = sys.argv[5].lower() == 'true'
+    seed = int(sys.argv[6]) if len(sys.argv) > 6 else None
+    print(run_simulation(amount, speed, radius, max_time, obstacle, seed=seed))
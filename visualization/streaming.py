@@ -0,0 +1,133 @@
+import numpy as np
+
+from reader import MASS, VX, VY, follow_frames, iter_frame_chunks
+
+
+class _GrowingArray:
+    """Rows appended in amortized O(new rows); view() is the filled part, without copying"""
+
+    def __init__(self, columns):
+        self._buffer = np.empty((1024, columns))
+        self._count = 0
+
+    def append(self, rows):
+        end = self._count + len(rows)
+        if end > len(self._buffer):
+            buffer = np.empty((max(2 * len(self._buffer), end), self._buffer.shape[1]))
+            buffer[:self._count] = self._buffer[:self._count]
+            self._buffer = buffer
+        self._buffer[self._count:end] = rows
+        self._count = end
+
+    def view(self):
+        return self._buffer[:self._count]
+
+
+class PressureSeries:
+    """Time, wall and obstacle pressure of every frame"""
+
+    def __init__(self):
+        self._values = _GrowingArray(3)
+
+    def update(self, chunk):
+        self._values.append(np.stack([chunk.times, chunk.wall_pressure, chunk.obstacle_pressure], axis=1))
+
+    def result(self):
+        values = self._values.view()
+        return values[:, 0], values[:, 1], values[:, 2]
+
+
+class CollisionSeries:
+    """Time and obstacle collision counters of every frame"""
+
+    def __init__(self):
+        self._values = _GrowingArray(3)
+
+    def update(self, chunk):
+        self._values.append(np.stack([chunk.times, chunk.first_time_collisions, chunk.total_collisions], axis=1))
+
+    def result(self):
+        values = self._values.view()
+        return values[:, 0], values[:, 1].astype(np.int64), values[:, 2].astype(np.int64)
+
+
+class TemperatureAccumulator:
+    """
+    Mean v² and mass over every particle of every frame, as used by
+    plot_pressure_over_temperature, plus the per-frame temperature series.
+    """
+
+    def __init__(self):
+        self.v_squared_sum = 0.0
+        self.mass_sum = 0.0
+        self.count = 0
+        self._series = _GrowingArray(1)
+
+    def update(self, chunk):
+        particles = chunk.particles
+        v_squared = particles[:, :, VX] ** 2 + particles[:, :, VY] ** 2
+        mass = particles[:, :, MASS]
+        self.v_squared_sum += v_squared.sum()
+        self.mass_sum += mass.sum()
+        self.count += v_squared.size
+        self._series.append((0.5 * mass.mean(axis=1) * v_squared.mean(axis=1))[:, None])
+
+    @property
+    def mean_v_squared(self):
+        return self.v_squared_sum / self.count
+
+    @property
+    def mean_mass(self):
+        return self.mass_sum / self.count
+
+    @property
+    def temperature(self):
+        return 0.5 * self.mean_mass * self.mean_v_squared
+
+    def series(self):
+        return self._series.view()[:, 0]
+
+
+class VelocityHistogram:
+    """
+    Histogram of particle speeds over every frame on fixed bin edges. When no
+    max_speed is given it is taken from the first frame: collisions are elastic,
+    so no particle can ever be faster than sqrt(2 E / m_min).
+    """
+
+    def __init__(self, bins=50, max_speed=None):
+        self.bins = bins
+        self.edges = None if max_speed is None else np.linspace(0, max_speed, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def update(self, chunk):
+        particles = chunk.particles
+        v_squared = particles[:, :, VX] ** 2 + particles[:, :, VY] ** 2
+        if self.edges is None:
+            mass = particles[0, :, MASS]
+            energy = 0.5 * np.sum(mass * v_squared[0])
+            # 1% headroom for the rounding of the written velocities
+            self.edges = np.linspace(0, 1.01 * np.sqrt(2 * energy / mass.min()), self.bins + 1)
+        self.counts += np.histogram(np.sqrt(v_squared), bins=self.edges)[0]
+
+    def result(self):
+        return self.edges, self.counts
+
+
+def stream_observables(filename, accumulators, chunk_frames=1024):
+    """Feed every chunk of filename to the accumulators; memory is bounded by chunk_frames"""
+    for chunk in iter_frame_chunks(filename, chunk_frames):
+        for accumulator in accumulators:
+            accumulator.update(chunk)
+    return accumulators
+
+
+def follow_observables(filename, accumulators, chunk_frames=1024, poll_interval=0.5, idle_timeout=None):
+    """
+    Feed the accumulators from a file that is still being written, yielding after
+    every new chunk so callers can refresh; each update only touches the new frames.
+    """
+    for chunk in follow_frames(filename, chunk_frames, poll_interval, idle_timeout):
+        for accumulator in accumulators:
+            accumulator.update(chunk)
+        yield accumulators
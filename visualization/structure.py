@@ -0,0 +1,194 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from query import query
+from simulation import CONTAINER_DIAMETER, OBSTACLE_RADIUS
+
+# Structural observables of the small particles, time-averaged over the run:
+# every frame holds until the next event, so it is weighted by that duration.
+#
+# Pairs closer than r_max are found for a whole chunk of frames with a single
+# KD-tree: frame k is lifted to z = k * FRAME_SPACING * r_max, so points of
+# different frames are never within r_max of each other. The container is not
+# periodic, so g(r) is normalized by the pair distances of uniformly placed
+# centres in the same annulus, estimated once by Monte Carlo.
+CONTAINER_RADIUS = CONTAINER_DIAMETER / 2
+FRAME_SPACING = 4.0
+IDEAL_SAMPLES = 20000
+
+
+def small_particles(radius):
+    """Ids of the particles that are not the big particle (which has the obstacle's radius)"""
+    return np.flatnonzero(radius != OBSTACLE_RADIUS)
+
+
+def accessible_annulus(radius, obstacle_present):
+    """Radii (inner, outer) between which the centre of a particle of this radius can be"""
+    inner = OBSTACLE_RADIUS + radius if obstacle_present else 0.0
+    return inner, CONTAINER_RADIUS - radius
+
+
+def pair_counts(positions, weights, r_max, bins):
+    """Histogram on [0, r_max) of the pair distances of every frame, weighted per frame"""
+    frames, n, _ = positions.shape
+    lifted = np.empty((frames, n, 3))
+    lifted[..., 0:2] = positions
+    lifted[..., 2] = (np.arange(frames) * FRAME_SPACING * r_max)[:, None]
+    pairs = cKDTree(lifted.reshape(-1, 3)).query_pairs(r_max, output_type='ndarray')
+    flat = positions.reshape(-1, 2)
+    distance = np.hypot(*(flat[pairs[:, 0]] - flat[pairs[:, 1]]).T)
+    index = np.minimum((distance / r_max * bins).astype(np.int64), bins - 1)
+    return np.bincount(index, weights=weights[pairs[:, 0] // n], minlength=bins)
+
+
+def radial_counts(positions, weights, edges):
+    """Histogram of the distance of every centre to the container's centre, weighted per frame"""
+    distance = np.hypot(positions[..., 0], positions[..., 1]).ravel()
+    index = np.searchsorted(edges, distance, side='right') - 1
+    inside = (index >= 0) & (index < len(edges) - 1)
+    frame_weights = np.repeat(weights, positions.shape[1])
+    return np.bincount(index[inside], weights=frame_weights[inside], minlength=len(edges) - 1)
+
+
+def ideal_pair_fraction(inner, outer, r_max, bins, samples=IDEAL_SAMPLES, seed=0):
+    """
+    Fraction of all pairs of uniform points in the annulus whose distance falls in each bin.
+    Per bin, samples pairs are drawn as a uniform point of the annulus and a
+    displacement uniform over the bin's ring: the fraction is the ring's area over
+    the annulus' times the share q of second points that land in the annulus too.
+    Memory is O(samples) and time O(samples * bins) whatever r_max, and q's
+    binomial error sqrt(q (1 - q) / samples) keeps every bin within about 1%
+    (one sigma) with the default 20000 samples, as q > 0.5 for r_max under the
+    annulus' width.
+    """
+    rng = np.random.default_rng(seed)
+    area = np.pi * (outer ** 2 - inner ** 2)
+    edges = np.linspace(0, r_max, bins + 1)
+    fraction = np.empty(bins)
+    for k in range(bins):
+        r = np.sqrt(rng.uniform(inner ** 2, outer ** 2, samples))
+        theta = rng.uniform(0, 2 * np.pi, samples)
+        d = np.sqrt(rng.uniform(edges[k] ** 2, edges[k + 1] ** 2, samples))
+        phi = rng.uniform(0, 2 * np.pi, samples)
+        distance = np.hypot(r * np.cos(theta) + d * np.cos(phi), r * np.sin(theta) + d * np.sin(phi))
+        landed = np.mean((distance >= inner) & (distance <= outer))
+        fraction[k] = np.pi * (edges[k + 1] ** 2 - edges[k] ** 2) / area * landed
+    return fraction
+
+
+def _accumulate_range(filename, start, stop, ids, r_max, bins, edges, chunk_frames):
+    """Weighted histograms of frames [start, stop); frame stop is read for the last duration"""
+    pairs = np.zeros(bins)
+    radial = np.zeros(len(edges) - 1)
+    total_weight = 0.0
+    for chunk_start in range(start, stop, chunk_frames):
+        chunk_stop = min(chunk_start + chunk_frames, stop)
+        projection = query(filename, fields=('x', 'y'), particles=ids, frames=slice(chunk_start, chunk_stop + 1))
+        weights = np.diff(projection.times)
+        positions = projection.particles[:len(weights)]
+        pairs += pair_counts(positions, weights, r_max, bins)
+        radial += radial_counts(positions, weights, edges)
+        total_weight += weights.sum()
+    return pairs, radial, total_weight
+
+
+def structure(filename, r_max=0.01, bins=100, radial_bins=100, inner=OBSTACLE_RADIUS, workers=None,
+              frames_per_task=4096, chunk_frames=512):
+    """
+    Time-averaged g(r) of the small particles up to r_max, and their radial
+    density profile from inner to the container wall. Frame ranges are split
+    across a process pool. Returns (g_df with r and g, density_df with r,
+    density [1/m²] and relative density to the mean over the accessible annulus).
+    """
+    times = query(filename).times
+    radius = query(filename, fields=('radius',), frames=slice(0, 1)).particles[0, :, 0]
+    obstacle_present = not np.any(radius == OBSTACLE_RADIUS)
+    ids = small_particles(radius)
+    n = len(ids)
+    edges = np.linspace(inner, CONTAINER_RADIUS, radial_bins + 1)
+
+    last = len(times) - 1
+    tasks = [(filename, start, min(start + frames_per_task, last), ids, r_max, bins, edges, chunk_frames)
+             for start in range(0, last, frames_per_task)]
+    if workers == 1 or len(tasks) <= 1:
+        results = [_accumulate_range(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_accumulate_range, *zip(*tasks)))
+    pairs = sum(result[0] for result in results)
+    radial = sum(result[1] for result in results)
+    total_weight = sum(result[2] for result in results)
+    if not total_weight:
+        raise ValueError(f"{filename} needs at least two frames at different times.")
+
+    annulus_inner, annulus_outer = accessible_annulus(radius[ids].max(), obstacle_present)
+    ideal = ideal_pair_fraction(annulus_inner, annulus_outer, r_max, bins) * n * (n - 1) / 2
+    r = (np.arange(bins) + 0.5) * r_max / bins
+    with np.errstate(divide='ignore', invalid='ignore'):
+        g = np.where(ideal > 0, pairs / total_weight / ideal, np.nan)
+    g_df = pd.DataFrame({'r': r, 'g': g})
+
+    area = np.pi * np.diff(edges ** 2)
+    density = radial / total_weight / area
+    mean_density = n / (np.pi * (annulus_outer ** 2 - annulus_inner ** 2))
+    density_df = pd.DataFrame({
+        'r': 0.5 * (edges[:-1] + edges[1:]),
+        'density': density,
+        'relative_density': density / mean_density,
+    })
+    return g_df, density_df
+
+
+def plot_radial_distribution(g_df, name):
+    plt.figure(figsize=(10, 6))
+    plt.plot(g_df['r'], g_df['g'], color='blue')
+    plt.axhline(1.0, color='gray', linestyle=':')
+    plt.xlabel('r [m]', fontsize=14)
+    plt.ylabel('g(r)', fontsize=14)
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(f'observables/radial_distribution_{os.path.basename(name)}.png')
+    plt.show()
+
+
+def plot_radial_density(density_df, name):
+    plt.figure(figsize=(10, 6))
+    plt.plot(density_df['r'], density_df['relative_density'], color='green')
+    plt.axhline(1.0, color='gray', linestyle=':')
+    plt.xlabel('Distancia al centro [m]', fontsize=14)
+    plt.ylabel('Densidad relativa', fontsize=14)
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(f'observables/radial_density_{os.path.basename(name)}.png')
+    plt.show()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python structure.py [--workers N] [--rmax <m>] <simulation_file1> <simulation_file2> ...")
+        sys.exit(1)
+
+    filenames = sys.argv[1:]
+    workers = None
+    if '--workers' in filenames:
+        i = filenames.index('--workers')
+        workers = int(filenames[i + 1])
+        del filenames[i:i + 2]
+    r_max = 0.01
+    if '--rmax' in filenames:
+        i = filenames.index('--rmax')
+        r_max = float(filenames[i + 1])
+        del filenames[i:i + 2]
+
+    os.makedirs('observables', exist_ok=True)
+    for filename in filenames:
+        g_df, density_df = structure(filename, r_max=r_max, workers=workers)
+        print(f"{filename}: g(r) máximo {g_df['g'].max():.2f} en r = {g_df['r'][g_df['g'].idxmax()]:.2e} m")
+        plot_radial_distribution(g_df, filename)
+        plot_radial_density(density_df, filename)
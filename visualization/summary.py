@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from pressure import pressure_estimate
+from streaming import CollisionSeries, PressureSeries, TemperatureAccumulator, stream_observables
+
+# Per-simulation aggregates of the sweep plots, memoized in a SQLite file. A
+# summary is keyed by the SHA-256 of the output's content and by the analysis
+# parameters, so renamed or copied files still hit and a changed file or
+# parameter misses. Hashes are themselves remembered by (path, size, mtime) so
+# unchanged files are not even reread.
+SUMMARY_DB = 'summaries.sqlite'
+SUMMARY_VERSION = 1
+HASH_BLOCK = 1 << 24
+
+
+def content_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        while block := f.read(HASH_BLOCK):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def summarize_file(filename, equilibration=0.1, blocks=256):
+    """
+    Aggregates of one output, streamed chunk by chunk: mean v² temperature,
+    block-averaged wall/obstacle pressure with errors, and obstacle collision totals.
+    """
+    pressure, collisions, temperature = stream_observables(
+        filename, [PressureSeries(), CollisionSeries(), TemperatureAccumulator()]
+    )
+    times, wall_pressure, obstacle_pressure = pressure.result()
+    _, first_time_collisions, total_collisions = collisions.result()
+    wall = pressure_estimate(times, wall_pressure, equilibration, blocks)
+    obstacle = pressure_estimate(times, obstacle_pressure, equilibration, blocks)
+    return {
+        'frames': len(times),
+        'total_time': float(times[-1]),
+        'mean_v_squared': float(temperature.mean_v_squared),
+        'mean_mass': float(temperature.mean_mass),
+        'temperature': float(temperature.temperature),
+        'wall_mean': float(wall['mean']), 'wall_error': float(wall['error']), 'wall_std': float(wall['std']),
+        'obstacle_mean': float(obstacle['mean']), 'obstacle_error': float(obstacle['error']),
+        'obstacle_std': float(obstacle['std']),
+        'first_time_collisions': int(first_time_collisions[-1]),
+        'total_collisions': int(total_collisions[-1]),
+        'collision_rate': float(total_collisions[-1] / times[-1]),
+    }
+
+
+def _summarize(arguments):
+    filename, params = arguments
+    return summarize_file(filename, **params)
+
+
+class SummaryStore:
+    """Persistent summaries of simulation outputs; summaries() only analyses files it has not seen"""
+
+    def __init__(self, path=SUMMARY_DB):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS hashes '
+                             '(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS summaries '
+                             '(hash TEXT, params TEXT, summary TEXT, PRIMARY KEY (hash, params))')
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def file_hash(self, filename):
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        row = self._db.execute('SELECT size, mtime_ns, hash FROM hashes WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            return row[2]
+        digest = content_hash(path)
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)',
+                             (path, stat.st_size, stat.st_mtime_ns, digest))
+        return digest
+
+    @staticmethod
+    def _params_key(params):
+        return json.dumps({'version': SUMMARY_VERSION, **params}, sort_keys=True)
+
+    def get(self, digest, params):
+        row = self._db.execute('SELECT summary FROM summaries WHERE hash = ? AND params = ?',
+                               (digest, self._params_key(params))).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, digest, params, summary):
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO summaries VALUES (?, ?, ?)',
+                             (digest, self._params_key(params), json.dumps(summary)))
+
+    def summaries(self, files, workers=None, equilibration=0.1, blocks=256):
+        """
+        One row per file, indexed by simulation (the file name). Missing
+        summaries are computed across a process pool and stored.
+        """
+        files = list(files)
+        params = {'equilibration': equilibration, 'blocks': blocks}
+        digests = [self.file_hash(f) for f in files]
+        results = {digest: self.get(digest, params) for digest in digests}
+        missing = {digest: f for f, digest in zip(files, digests) if results[digest] is None}
+
+        tasks = [(f, params) for f in missing.values()]
+        if workers == 1 or len(tasks) <= 1:
+            computed = [_summarize(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                computed = list(pool.map(_summarize, tasks))
+        for digest, summary in zip(missing, computed):
+            self.put(digest, params, summary)
+            results[digest] = summary
+
+        df = pd.DataFrame([results[digest] for digest in digests], index=pd.Index(files, name='simulation'))
+        return df.sort_index()
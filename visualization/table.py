@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+from reader import MASS, RADIUS, VY, X
+from resample import resample_states
+
+STATE_COLUMNS = ['x', 'y', 'vx', 'vy']
+
+
+class ParticleTable:
+    """
+    Particle data of one run kept in its natural shape: a frames x N x 4 state
+    block (x, y, vx, vy), per-particle radius and mass, a per-frame time vector
+    and an integer simulation id. to_dataframe() builds the long format on demand.
+    """
+
+    def __init__(self, times, state, radius, mass, simulation=0, name=None):
+        self.times = times
+        self.state = state
+        self.radius = radius
+        self.mass = mass
+        self.simulation = simulation
+        self.name = name
+
+    @classmethod
+    def from_simulation_data(cls, data, simulation=0, name=None, dtype=None):
+        # x, y, vx, vy are adjacent columns, so this stays a view of the particle block
+        state = data.particles[:, :, X:VY + 1]
+        if dtype is not None:
+            state = state.astype(dtype)
+        # Radius and mass never change, the first frame is enough
+        return cls(
+            times=data.times,
+            state=state,
+            radius=np.array(data.particles[0, :, RADIUS]),
+            mass=np.array(data.particles[0, :, MASS]),
+            simulation=simulation,
+            name=name,
+        )
+
+    @property
+    def n(self):
+        return self.state.shape[1]
+
+    @property
+    def frames(self):
+        return self.state.shape[0]
+
+    def v_squared(self):
+        return self.state[:, :, 2] ** 2 + self.state[:, :, 3] ** 2
+
+    def mean_mass(self):
+        return self.mass.mean()
+
+    def mean_v_squared(self):
+        return self.v_squared().mean()
+
+    def temperature(self):
+        return 0.5 * self.mean_mass() * self.mean_v_squared()
+
+    def resample(self, query_times):
+        """State at the given times (e.g. uniform_times(table.times, dt)) as a new table"""
+        query_times = np.asarray(query_times, dtype=np.float64)
+        return ParticleTable(
+            times=query_times,
+            state=resample_states(self.times, self.state, query_times),
+            radius=self.radius,
+            mass=self.mass,
+            simulation=self.simulation,
+            name=self.name,
+        )
+
+    def to_dataframe(self, categories=None):
+        df = pd.DataFrame(self.state.reshape(-1, len(STATE_COLUMNS)), columns=STATE_COLUMNS)
+        df.insert(0, 'time', np.repeat(self.times, self.n))
+        df['radius'] = np.tile(self.radius, self.frames)
+        df['mass'] = np.tile(self.mass, self.frames)
+        if self.name is not None:
+            categories = [self.name] if categories is None else categories
+            codes = np.full(len(df), categories.index(self.name), dtype=np.int32)
+            df['simulation'] = pd.Categorical.from_codes(codes, categories)
+        return df
+
+
+class ParticleTableSet:
+    """Several ParticleTable runs addressed by simulation name, as groupby('simulation') would order them"""
+
+    def __init__(self, tables):
+        self.tables = sorted(tables, key=lambda table: table.name)
+
+    @classmethod
+    def from_simulation_data(cls, names, datas, dtype=None):
+        return cls([
+            ParticleTable.from_simulation_data(data, simulation=i, name=name, dtype=dtype)
+            for i, (name, data) in enumerate(zip(names, datas))
+        ])
+
+    @property
+    def names(self):
+        return [table.name for table in self.tables]
+
+    def __iter__(self):
+        return iter(self.tables)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def __getitem__(self, name):
+        for table in self.tables:
+            if table.name == name:
+                return table
+        raise KeyError(name)
+
+    def _per_simulation(self, values):
+        return pd.Series(values, index=pd.Index(self.names, name='simulation'))
+
+    def mean_mass(self):
+        return self._per_simulation([table.mean_mass() for table in self.tables])
+
+    def mean_v_squared(self):
+        return self._per_simulation([table.mean_v_squared() for table in self.tables])
+
+    def temperature(self):
+        return 0.5 * self.mean_mass() * self.mean_v_squared()
+
+    def to_dataframe(self):
+        return pd.concat([table.to_dataframe(self.names) for table in self.tables], ignore_index=True)
@@ -1,6 +1,16 @@
+import os
+import shutil
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 import pygame
 import numpy as np
+from frames import FrameSource
+from profiling import enable_from_args, stage
+from query import query
+from resample import resample_positions, uniform_times
 
 # Configuration
 WIDTH, HEIGHT = 800, 800
@@ -9,41 +19,15 @@ BACKGROUND_COLOR = (255, 255, 255)  # White
 PARTICLE_COLOR = (0, 0, 255)        # Blue
 CONTAINER_COLOR = (0, 0, 0)         # Black
 OBSTACLE_COLOR = (255, 0, 0)        # Red
+SPRITE_KEY = (255, 0, 255)          # Transparent colour of the particle sprites
+# Above this many particles playback starts in pixel-dot mode (D toggles it)
+DOTS_ABOVE = 20000
 OBSTACLE_RADIUS=0.005
 obstacle_present=True
 # Physics scaling
 CONTAINER_RADIUS = 0.05
 SCALE_FACTOR = min(WIDTH, HEIGHT) / (2 * CONTAINER_RADIUS * 1.1)  # Add 10% padding
 
-def parse_simulation_file(filename):
-    """Parse the simulation output file"""
-    frames = []
-    with open(filename, "r") as f:
-        lines = [line.strip() for line in f if line.strip()]
-
-    idx = 0
-    N = int(lines[idx])
-    idx += 1
-
-    while idx < len(lines):
-        time = float(lines[idx])
-        idx += 3
-
-        particles = []
-        for _ in range(N):
-            parts = lines[idx].split()
-            x, y = float(parts[0]), float(parts[1])
-            radius = float(parts[4])
-            if radius==OBSTACLE_RADIUS:
-                global obstacle_present
-                obstacle_present=False
-            particles.append((x, y, radius))
-            idx += 1
-
-        frames.append((time, np.array(particles)))
-
-    return frames
-
 def pygame_coords(x, y):
     """Convert simulation coordinates to pygame screen coordinates"""
     screen_x = WIDTH // 2 + x * SCALE_FACTOR
@@ -54,27 +38,208 @@ def pygame_radius(radius):
     """Convert simulation radius to pygame pixels"""
     return max(1, int(radius * SCALE_FACTOR))  # Ensure at least 1 pixel
 
-def main():
+def screen_coords(positions):
+    """Convert an N x 2 array of simulation coordinates to pygame screen coordinates in one transform"""
+    screen = np.empty(positions.shape, dtype=np.int64)
+    screen[:, 0] = (WIDTH // 2 + positions[:, 0] * SCALE_FACTOR).astype(np.int64)
+    screen[:, 1] = (HEIGHT // 2 - positions[:, 1] * SCALE_FACTOR).astype(np.int64)  # Flip y-axis
+    return screen
+
+def screen_radii(radius):
+    """Convert an array of simulation radii to pygame pixels"""
+    return np.maximum(1, (radius * SCALE_FACTOR).astype(np.int64))
+
+# Pre-rendered particle discs by pixel radius. A disc drawn around (r, r) and
+# blitted at (x - r, y - r) covers exactly the pixels pygame.draw.circle would at (x, y).
+_sprites = {}
+
+def particle_sprite(r):
+    if r not in _sprites:
+        sprite = pygame.Surface((2 * r + 1, 2 * r + 1))
+        sprite.fill(SPRITE_KEY)
+        pygame.draw.circle(sprite, PARTICLE_COLOR, (r, r), r)
+        sprite.set_colorkey(SPRITE_KEY, pygame.RLEACCEL)
+        _sprites[r] = sprite
+    return _sprites[r]
+
+def draw_particles(screen, coords, radii):
+    """Blit the sprite of every particle, one Surface.blits call per distinct radius"""
+    for r in np.unique(radii).tolist():
+        same = radii == r
+        screen.blits(zip(repeat(particle_sprite(r)), (coords[same] - r).tolist()), doreturn=False)
+
+def draw_dots(screen, coords):
+    """One pixel per particle, written straight into the surface's pixels"""
+    inside = (coords[:, 0] >= 0) & (coords[:, 0] < WIDTH) & (coords[:, 1] >= 0) & (coords[:, 1] < HEIGHT)
+    pixels = pygame.surfarray.pixels2d(screen)  # indexed [x, y], locks the surface while alive
+    pixels[coords[inside, 0], coords[inside, 1]] = screen.map_rgb(PARTICLE_COLOR)
+    del pixels
+
+def draw_frame(screen, positions, radii, dots=False):
+    """
+    Draw the container, the particles at the given N x 2 positions and the obstacle.
+    With dots, particles of the smallest radius are single pixels and only larger
+    ones (the big particle) are drawn as discs.
+    """
+    # Clear screen
+    screen.fill(BACKGROUND_COLOR)
+
+    # Draw container
+    pygame.draw.circle(
+        screen, CONTAINER_COLOR,
+        (WIDTH // 2, HEIGHT // 2),
+        int(CONTAINER_RADIUS * SCALE_FACTOR),
+        1  # Line width
+    )
+
+    # Draw particles
+    coords = screen_coords(positions)
+    if dots:
+        large = radii > radii.min()
+        draw_dots(screen, coords[~large])
+        draw_particles(screen, coords[large], radii[large])
+    else:
+        draw_particles(screen, coords, radii)
+
+    # Draw obstacle (if present)
+    if obstacle_present:
+        obstacle_radius = pygame_radius(OBSTACLE_RADIUS)
+        pygame.draw.circle(
+            screen, OBSTACLE_COLOR,
+            (WIDTH // 2, HEIGHT // 2),
+            obstacle_radius,
+            1  # Line width
+        )
+
+def draw_help(screen, font, lines):
+    for i, line in enumerate(lines):
+        screen.blit(font.render(line, True, CONTAINER_COLOR), (10, 10 + 20 * i))
+
+def draw_fps(screen, font, clock, frame_time):
+    text = font.render(f"{clock.get_fps():.0f} FPS  {1000 * frame_time:.1f} ms", True, CONTAINER_COLOR)
+    screen.blit(text, (WIDTH - text.get_width() - 10, HEIGHT - 30))
+
+def _render_range(filename, queries, start, output, image_format, has_obstacle):
+    """
+    Render ('frame', indices) or ('time', times) queries on an offscreen Surface,
+    which needs no display; frames are numbered from start.
+    """
+    global obstacle_present
+    obstacle_present = has_obstacle
+    surface = pygame.Surface((WIDTH, HEIGHT))
+
+    # Only this task's frames are decoded, and of those only the state
+    kind, values = queries
+    radii = screen_radii(query(filename, fields=('radius',), frames=slice(0, 1)).particles[0, :, 0])
+    if kind == 'time':
+        projection = query(filename, fields=('x', 'y', 'vx', 'vy'), t_min=values[0], t_max=values[-1])
+        positions = resample_positions(projection.times, projection.particles, values)
+    else:
+        positions = query(filename, fields=('x', 'y'), frames=slice(values[0], values[-1] + 1)).particles
+
+    if image_format == 'png':
+        for i, frame_positions in enumerate(positions):
+            draw_frame(surface, frame_positions, radii)
+            pygame.image.save(surface, os.path.join(output, f"frame_{start + i:06d}.png"))
+        return None
+
+    part = os.path.join(output, f".part_{start:06d}.rgb")
+    with open(part, 'wb') as f:
+        for frame_positions in positions:
+            draw_frame(surface, frame_positions, radii)
+            f.write(pygame.image.tobytes(surface, 'RGB'))
+    return part
+
+def export_frames(filename, output, dt=None, workers=None, image_format='png', frames_per_task=64):
+    """
+    Render a run without a display, split in frame ranges across a process pool.
+    image_format 'png' writes output/frame_NNNNNN.png; 'raw' writes output/frames.rgb,
+    a stream of WIDTH x HEIGHT RGB24 frames, e.g. for
+    ffmpeg -f rawvideo -pix_fmt rgb24 -s 800x800 -r 60 -i frames.rgb clip.mp4
+    With dt, frames are taken every dt seconds of simulation time instead of one per event.
+    """
+    os.makedirs(output, exist_ok=True)
+    # Only the frame times and the radii; this also builds the frame index once for every worker
+    with stage('index') as index:
+        timeline = query(filename)
+        first = query(filename, fields=('radius',), frames=slice(0, 1))
+        times, radius = timeline.times, first.particles[0, :, 0]
+        index.add(frames=len(times), bytes_read=timeline.nbytes + first.nbytes)
+    has_obstacle = not np.any(radius == OBSTACLE_RADIUS)
+    if dt is None:
+        queries = ('frame', np.arange(len(times)))
+    else:
+        queries = ('time', uniform_times(times, dt))
+
+    kind, values = queries
+    tasks = [(filename, (kind, values[start:start + frames_per_task]), start, output, image_format, has_obstacle)
+             for start in range(0, len(values), frames_per_task)]
+    with stage('render', frames=len(values)), ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_render_range, *zip(*tasks)))
+
+    if image_format == 'raw':
+        with stage('concatenate'), open(os.path.join(output, 'frames.rgb'), 'wb') as f:
+            for part in parts:
+                with open(part, 'rb') as p:
+                    shutil.copyfileobj(p, f)
+                os.remove(part)
+    return len(values)
+
+def main(filename, dt=None, speed=None, follow=False, dots=False):
+    """
+    Play a run back in a window. With dt, at a constant simulation-time step
+    instead of one frame per event; with speed, that many simulated seconds per
+    wall-clock second, skipping whatever frames the drawing cannot keep up with.
+    dt and speed exclude each other.
+    follow keeps reading a file the simulation is still writing; dots starts in
+    pixel-dot mode.
+    """
+    global obstacle_present
+    if dt is not None and speed is not None:
+        raise ValueError("dt and speed both set the playback step, give only one of them.")
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Particle Simulation")
     clock = pygame.time.Clock()
     font = pygame.font.SysFont('Arial', 18)
 
-    frames = parse_simulation_file(sys.argv[1])
+    # Frames are decoded in the background; drawing starts with the first one
+    source = FrameSource(filename, follow=follow)
+    with stage('first_frame', frames=1):
+        first = source.wait(1)
+    if first == 0:
+        raise ValueError(f"No frames in {filename}: {source.error}")
+    radius = source.radius()
+    radii = screen_radii(radius)
+    if np.any(radius == OBSTACLE_RADIUS):
+        obstacle_present = False
+
     current_frame = 0
+    current_time = source.times[0]
     paused = False
     show_help = True
+    show_fps = True
+    dots = dots or len(radius) > DOTS_ABOVE
+    frame_time = 0.0
+
+    def seek_frame(index):
+        nonlocal current_frame, current_time
+        current_frame = int(np.clip(index, 0, len(source) - 1))
+        current_time = source.frame(current_frame)[0]
+
+    def seek_time(t):
+        nonlocal current_frame, current_time
+        times = source.times
+        current_time = float(np.clip(t, times[0], times[-1]))
+        current_frame = source.index_at_time(current_time)
 
-    # Precompute all positions in screen coordinates
-    screen_positions = []
-    for time, particles in frames:
-        frame_data = []
-        for x, y, r in particles:
-            screen_x, screen_y = pygame_coords(x, y)
-            screen_r = pygame_radius(r)
-            frame_data.append((screen_x, screen_y, screen_r))
-        screen_positions.append(frame_data)
+    def advance_time(step):
+        # Wrap around only once every frame is decoded, otherwise hold at the last one
+        times = source.times
+        if current_time + step <= times[-1]:
+            seek_time(current_time + step)
+        elif source.complete:
+            seek_time(times[0])
 
     running = True
     while running:
@@ -82,44 +247,64 @@ def main():
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN:
+                step = 1 if event.key in (pygame.K_RIGHT, pygame.K_LEFT) else max(1, len(source) // 10)
+                if event.key in (pygame.K_LEFT, pygame.K_PAGEDOWN):
+                    step = -step
                 if event.key == pygame.K_SPACE:
                     paused = not paused
                 elif event.key == pygame.K_h:
                     show_help = not show_help
-                elif event.key == pygame.K_RIGHT and paused:
-                    current_frame = min(current_frame + 1, len(frames) - 1)
-                elif event.key == pygame.K_LEFT and paused:
-                    current_frame = max(current_frame - 1, 0)
-
-        # Clear screen
-        screen.fill(BACKGROUND_COLOR)
-
-        # Draw container
-        pygame.draw.circle(
-            screen, CONTAINER_COLOR,
-            (WIDTH // 2, HEIGHT // 2),
-            int(CONTAINER_RADIUS * SCALE_FACTOR),
-            1  # Line width
-        )
-
-        # Draw particles
-        for x, y, r in screen_positions[current_frame]:
+                elif event.key == pygame.K_f:
+                    show_fps = not show_fps
+                elif event.key == pygame.K_d:
+                    dots = not dots
+                elif event.key == pygame.K_HOME:
+                    seek_frame(0)
+                elif event.key == pygame.K_END:
+                    seek_frame(len(source) - 1)
+                elif event.key in (pygame.K_RIGHT, pygame.K_LEFT) and paused \
+                        or event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                    if dt is None:
+                        seek_frame(current_frame + step)
+                    else:
+                        seek_time(current_time + step * dt)
 
-            pygame.draw.circle(screen, PARTICLE_COLOR, (x, y), r)
+        start = time.perf_counter()
+        with stage('prepare', frames=1):
+            if dt is None and speed is None:
+                current_time, particles = source.frame(current_frame)
+                positions = particles[:, 0:2]
+            elif dt is None:
+                # The event in effect at the playback time
+                positions = source.frame(current_frame)[1][:, 0:2]
+            else:
+                positions = source.state_at_time(current_time)[:, 0:2]
 
-        # Draw obstacle (if present)
-        if obstacle_present:
-            obstacle_radius = pygame_radius(0.005)
-            pygame.draw.circle(
-                screen, OBSTACLE_COLOR,
-                (WIDTH // 2, HEIGHT // 2),
-                obstacle_radius,
-                1  # Line width
-            )
-        pygame.display.flip()
+        with stage('draw', frames=1):
+            draw_frame(screen, positions, radii, dots)
+            if show_help:
+                loaded = "" if source.complete else " (cargando...)"
+                draw_help(screen, font, [
+                    f"t = {current_time:.4f} s   frame {current_frame + 1}/{len(source)}{loaded}",
+                    "Espacio: pausa   Flechas: paso   RePag/AvPag: saltar   Inicio/Fin   H: ayuda",
+                    "D: puntos   F: FPS",
+                ])
+            if show_fps:
+                draw_fps(screen, font, clock, frame_time)
+            pygame.display.flip()
+        frame_time = time.perf_counter() - start
 
         if not paused:
-            current_frame = (current_frame + 1) % len(frames)
+            if speed is not None:
+                # Time of the previous frame, as measured by the clock
+                advance_time(speed * clock.get_time() / 1000)
+            elif dt is None:
+                if current_frame + 1 < len(source):
+                    current_frame += 1
+                elif source.complete:
+                    current_frame = 0
+            else:
+                advance_time(dt)
 
         clock.tick(FPS)
 
@@ -128,6 +313,22 @@ def main():
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python pygame_animation.py <simulation_file>")
+        print("Usage: python pygame_animation.py <simulation_file> [--dt <seconds> | --speed <s/s>] [--dots] [--follow] "
+              "[--export <directory> [--format png|raw] [--workers N]] [--profile | --profile-memory]")
         sys.exit(1)
-    main()
\ No newline at end of file
+    # --profile / --profile-memory: per-stage report in profile-visualization.json/.csv
+    enable_from_args(sys.argv, 'visualization')
+    if '--export' in sys.argv:
+        dt = float(sys.argv[sys.argv.index('--dt') + 1]) if '--dt' in sys.argv else None
+        workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv else None
+        image_format = sys.argv[sys.argv.index('--format') + 1] if '--format' in sys.argv else 'png'
+        output = sys.argv[sys.argv.index('--export') + 1]
+        count = export_frames(sys.argv[1], output, dt, workers, image_format)
+        print(f"{count} frames written to {output}")
+    else:
+        if '--dt' in sys.argv and '--speed' in sys.argv:
+            print("Usage error: --dt and --speed both set the playback step, give only one of them")
+            sys.exit(2)
+        dt = float(sys.argv[sys.argv.index('--dt') + 1]) if '--dt' in sys.argv else None
+        speed = float(sys.argv[sys.argv.index('--speed') + 1]) if '--speed' in sys.argv else None
+        main(sys.argv[1], dt, speed, follow='--follow' in sys.argv, dots='--dots' in sys.argv)
\ No newline at end of file